@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Compares two result files written by bench_suite.py and flags regressions.
+
+A metric regresses when it moved the wrong way by more than --threshold (relative). Exits
+non-zero if any did, so it can gate a CI job:
+
+    python benchmarks/bench_compare.py baseline.json results.json --threshold 0.10
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report["meta"], { m["name"]: m for m in report["results"] }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    base_meta, base = load(args.baseline)
+    meta, results = load(args.results)
+    print("baseline {} ({}), results {} ({})".format(
+            base_meta.get("commit"), base_meta.get("date"), meta.get("commit"), meta.get("date")))
+
+    regressions = []
+    print("{:<44} {:>14} {:>14} {:>9}".format("metric", "baseline", "results", "change"))
+    for name, metric in results.items():
+        if name not in base or not base[name]["value"]:
+            print("{:<44} {:>14} {:>14.2f} {:>9}".format(name, "-", metric["value"], "new"))
+            continue
+        before, after = base[name]["value"], metric["value"]
+        change = (after - before) / before
+        worse = change > args.threshold if metric["better"] == "lower" else change < -args.threshold
+        if worse:
+            regressions.append(name)
+        print("{:<44} {:>14.2f} {:>14.2f} {:>+8.1%} {}".format(name, before, after, change, "REGRESSED" if worse else ""))
+
+    for name in base:
+        if name not in results:
+            print("{:<44} {:>14.2f} {:>14} {:>9}".format(name, base[name]["value"], "-", "missing"))
+
+    if regressions:
+        print("{} regressed by more than {:.0%}: {}".format(len(regressions), args.threshold, ", ".join(regressions)))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
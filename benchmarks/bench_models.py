@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Memory per Transfer and from_json parse throughput.
+
+    python benchmarks/bench_models.py --count 100000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from cps_client import api
+
+
+def transfer_json(i):
+    return {
+        "id": "b08478d5-a110-4b0e-9136-{:012d}".format(i),
+        "source": {"type": "wallet", "id": "1000004286"},
+        "destination": {
+            "type": "blockchain",
+            "address": "0x71715Da6ADa699e3a1a5C2664A55fF3D179c86EE",
+            "chain": "ETH"
+        },
+        "amount": {"amount": "0.05", "currency": "USD"},
+        "status": "complete",
+        "transactionHash": "0x52176702740c8720d77ade3f20014396a4a2eb13d09dd1e6bffcc6f209a45326",
+        "createDate": "2020-04-10T02:13:30.000Z"
+    }
+
+
+def bytes_per_transfer(page):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    transfers = [api.Transfer.from_json(t) for t in page]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # the strings are shared with the decoded JSON, so this is the cost of the object graph
+    return (after - before) / len(transfers)
+
+
+def parse_rate(page, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        [api.Transfer.from_json(t) for t in page]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(page) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    page = [transfer_json(i) for i in range(args.count)]
+
+    print("bytes per Transfer   {:10.1f}".format(bytes_per_transfer(page)))
+    print("from_json per second {:10.0f}".format(parse_rate(page)))
+
+
+if __name__ == "__main__":
+    main()
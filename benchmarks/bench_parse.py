@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Decode and model-build throughput for list pages, eager vs lazy, per JSON backend.
+
+By default it parses synthetic pages shaped like GET /v1/transfers responses; pass recorded
+response bodies (one JSON document per file) with --fixture to use real ones:
+
+    python benchmarks/bench_parse.py --pages 200 --page-size 50
+"""
+
+import argparse
+import json
+import time
+
+from cps_client import api
+from cps_client.api import codec
+
+from bench_models import transfer_json
+
+
+def synthetic_pages(pages, pageSize):
+    return [json.dumps({"data": [transfer_json(p * pageSize + i) for i in range(pageSize)]}).encode()
+            for p in range(pages)]
+
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def scan(pages, loads, from_json, touch):
+    for body in pages:
+        for t in [from_json(t) for t in loads(body)["data"]]:
+            touch(t)
+
+
+def ids_and_statuses(t):
+    return t.id, t.status
+
+
+def everything(t):
+    return t.id, t.status, t.source.type, t.destination.type, t.amount.amount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--fixture", action="append", default=[], help="recorded response body to parse")
+    args = parser.parse_args()
+
+    if args.fixture:
+        pages = []
+        for path in args.fixture:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    else:
+        pages = synthetic_pages(args.pages, args.page_size)
+    count = sum(len(json.loads(p)["data"]) for p in pages)
+
+    decoders = [("json", json.loads)]
+    if codec.backend != "json":
+        decoders.append((codec.backend, codec.loads))
+
+    print("{} transfers in {} pages".format(count, len(pages)))
+    for name, loads in decoders:
+        print("{:<8} {:<23} {:10.0f} transfers/s".format(
+            name, "decode only", count / best_of(lambda: [loads(p) for p in pages])))
+        for label, touch in (("id+status", ids_and_statuses), ("all", everything)):
+            for model in (api.Transfer, api.LazyTransfer):
+                elapsed = best_of(lambda: scan(pages, loads, model.from_json, touch))
+                print("{:<8} {:<13} {:<9} {:10.0f} transfers/s".format(
+                    name, model.__name__, label, count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
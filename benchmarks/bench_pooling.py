@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Per-call latency of api.Client with and without connection pooling.
+
+Runs against a local keep-alive stub server so no CPS credentials are needed:
+
+    python benchmarks/bench_pooling.py --calls 500
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from cps_client import api
+
+
+CONFIGURATION = json.dumps({"data": {"payments": {"masterWalletId": "1000000000"}}}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(CONFIGURATION)))
+        self.end_headers()
+        self.wfile.write(CONFIGURATION)
+
+    def log_message(self, *args):
+        pass
+
+
+def unpooled_get_configuration(client):
+    # what every Client call did before pooling: a fresh connection per request
+    resource = "/".join([client.host, client.version, "configuration"])
+    res = requests.get(resource, headers=client._default_headers())
+    return api.Configuration.from_json(res.json()["data"])
+
+
+def measure(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print("{:<10} mean {:8.1f}us   p50 {:8.1f}us   p99 {:8.1f}us".format(
+        name,
+        statistics.mean(samples) * 1e6,
+        statistics.median(samples) * 1e6,
+        p99 * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = "http://127.0.0.1:{}".format(server.server_address[1])
+
+    try:
+        with api.Client(host, "bench") as client:
+            # warm up both paths so imports and the first connect aren't counted
+            client.get_configuration()
+            unpooled_get_configuration(client)
+
+            report("unpooled", measure(lambda: unpooled_get_configuration(client), args.calls))
+            report("pooled", measure(client.get_configuration, args.calls))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Per-call overhead of preparing a request: building the URL, headers and query params.
+
+The parts are timed on their own, then whole calls through a transport that answers at once
+with a canned response, so nothing but the client's own work is measured. With --requests the
+calls go through a RequestsTransport instead, which prepares them with requests as it would
+on the wire, and only the sending is skipped:
+
+    python benchmarks/bench_prepare.py --calls 100000
+"""
+
+import argparse
+import json
+import time
+
+from cps_client import api
+from cps_client.api.transport import Response
+
+from bench_models import transfer_json
+
+
+class CannedTransport:
+    """Answers every request with the same response, without a network."""
+
+    errors = ()
+
+    def __init__(self, content):
+        self.response = Response(200, { "Content-Type": "application/json" }, content)
+
+    def send(self, method, url, params=None, data=None, headers=None):
+        return self.response
+
+    def close(self):
+        pass
+
+def canned_requests_transport(content):
+    """A RequestsTransport, preparing requests as it does before sending them, whose adapter
+    answers with content instead of sending anything."""
+    import requests.adapters
+    import requests.models
+
+    class CannedAdapter(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            res = requests.models.Response()
+            res.status_code = 200
+            res._content = content
+            res.request = request
+            res.url = request.url
+            return res
+
+    transport = api.RequestsTransport()
+    transport.session.mount("https://", CannedAdapter())
+    return transport
+
+
+def per_call(fn, calls):
+    """Best of three runs, in microseconds per call."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--requests", action="store_true", help="prepare each request with requests too")
+    args = parser.parse_args()
+
+    transfer = json.dumps({ "data": transfer_json(0) }).encode()
+    if args.requests:
+        transport = canned_requests_transport(transfer)
+    else:
+        transport = CannedTransport(transfer)
+    client = api.Client("https://api-sandbox.circle.com", "key", transport=transport)
+
+    id = "b08478d5-a110-4b0e-9136-000000000000"
+    pagination = api.PaginationParams(pageSize=50, pageAfter=id)
+    dates = api.DateTimeParams(from_="2020-04-01T00:00:00Z")
+    wallets = api.TransferParams("1000004286", None)
+
+    parts = [
+        ("url get_transfer", lambda: client._get_transfer(id)),
+        ("url get_wallet_addresses", lambda: client._get_wallet_addresses("1000004286")),
+        ("headers", client._default_headers),
+        ("params get_transfers", lambda: client._get_transfers(pagination, dates, wallets)),
+    ]
+    for name, fn in parts:
+        print("{:<32} {:8.2f} us".format(name, per_call(fn, args.calls)))
+
+    calls = max(1, args.calls // 10)
+    print("{:<32} {:8.2f} us".format("call get_transfer", per_call(lambda: client.get_transfer(id), calls)))
+    client = api.Client("https://api-sandbox.circle.com", "key", transport=(canned_requests_transport if args.requests else CannedTransport)(
+            json.dumps({ "data": [] }).encode()))
+    print("{:<32} {:8.2f} us".format("call get_transfers", per_call(lambda: client.get_transfers(pagination, dates, wallets), calls)))
+
+
+if __name__ == "__main__":
+    main()
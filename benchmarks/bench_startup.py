@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Import time of the CLI and the client package, measured with ``python -X importtime``.
+
+Every run is a fresh interpreter. Exits non-zero when the CLI imports a module it should defer
+until a command runs, or when --max-ms is given and the CLI takes longer than that to import:
+
+    python benchmarks/bench_startup.py --runs 10 --max-ms 60
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+# modules only a command should need, never `cps --help`
+DEFERRED = ("requests", "aiohttp", "asyncio", "json", "uuid", "cps_client.api", "cps_client.commands")
+
+
+def import_times(module, runs):
+    """Cumulative import times of module, in ms, and the modules it imported."""
+    times = []
+    imported = set()
+    for _ in range(runs):
+        proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import " + module],
+                stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            name = name.strip()
+            if not cumulative.strip().isdigit():
+                continue
+            imported.add(name)
+            if name == module:
+                times.append(int(cumulative) / 1000)
+    return times, imported
+
+
+def help_time(runs):
+    """Wall time of `python -m cps_client.cli --help`, in ms."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "cps_client.cli", "--help"], stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when the CLI median import time exceeds this")
+    args = parser.parse_args()
+
+    cli, imported = import_times("cps_client.cli", args.runs)
+    package, _ = import_times("cps_client.api", args.runs)
+
+    print("import cps_client.cli  median {:7.1f} ms  min {:7.1f} ms".format(statistics.median(cli), min(cli)))
+    print("import cps_client.api  median {:7.1f} ms  min {:7.1f} ms".format(statistics.median(package), min(package)))
+    wall = help_time(args.runs)
+    print("cps --help (wall)      median {:7.1f} ms  min {:7.1f} ms".format(statistics.median(wall), min(wall)))
+
+    failed = False
+    eager = [m for m in DEFERRED if m in imported]
+    if eager:
+        print("importing the CLI loads modules that should be deferred: " + ", ".join(eager))
+        failed = True
+    if args.max_ms is not None and statistics.median(cli) > args.max_ms:
+        print("CLI import time exceeds {} ms".format(args.max_ms))
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
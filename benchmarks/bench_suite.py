@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""End-to-end benchmarks of the client's hot paths, offline, with machine-readable results.
+
+Requests go to a ``cps_client.stub`` server on localhost, run in its own process so it doesn't
+compete with the client for the GIL. The groups are:
+
+    calls      latency of a single call, for every Client method
+    scan       iter_transfers over --scan-transfers transfers, eager, lazy and prefetching
+    create     create_transfers throughput at each --concurrency, with --create-latency per request
+    parse      decode and from_json throughput on pages of --page-size transfers
+    serialize  str() and json.dumps of transfers
+    startup    import time of the CLI and the package, and `cps --help`
+
+Results are written as JSON to --output, one metric per entry with its unit and whether lower or
+higher is better, for ``bench_compare.py`` to diff against an earlier run:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json
+    python benchmarks/bench_compare.py before.json after.json
+
+--quick shrinks every group for a smoke test, and --only runs some of them.
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from cps_client import api
+from cps_client.api import codec
+from cps_client.api.model import json_default
+
+from bench_models import transfer_json
+from bench_parse import synthetic_pages
+import bench_startup
+
+
+GROUPS = ("calls", "scan", "create", "parse", "serialize", "startup")
+
+
+class Results:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, name, value, unit, better="lower", **extra):
+        self.metrics.append({ "name": name, "value": value, "unit": unit, "better": better, **extra })
+        print("{:<44} {:>14.2f} {}".format(name, value, unit), flush=True)
+
+    def latency(self, name, histogram):
+        """p50 of histogram, in microseconds, with its mean and p99 alongside."""
+        self.add(name, histogram.percentile(50) * 1e6, "us",
+                mean=histogram.mean() * 1e6, p99=histogram.percentile(99) * 1e6, count=histogram.count)
+
+@contextlib.contextmanager
+def stub_server(*options):
+    """Runs `python -m cps_client.stub` with options on a free port and yields its URL."""
+    proc = subprocess.Popen([sys.executable, "-m", "cps_client.stub", "--port", "0", "--seed", "1", *map(str, options)],
+            stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        # the stub prints its URL once it's listening
+        yield proc.stdout.readline().split()[-1]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def timed(fn, calls):
+    histogram = api.Histogram()
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        histogram.record(time.perf_counter() - start)
+    return histogram
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_calls(results, args):
+    with stub_server("--wallets", 10, "--transfers", 1000) as url, api.Client(url, "bench") as client:
+        masterWalletId = client.get_configuration().payments.masterWalletId
+        wallet = client.create_wallet()
+        client.create_wallet_address(wallet.walletId, "USD", "ETH")
+        transfer = client.get_transfers()[0]
+        source = api.WalletLocation(masterWalletId)
+        destination = api.BlockchainLocation("0x71715Da6ADa699e3a1a5C2664A55fF3D179c86EE", "ETH")
+        amount = api.Money("0.01", "USD")
+        endpoint = "https://example.com/notifications"
+
+        calls = [
+            ("get_configuration", client.get_configuration),
+            ("get_wallet", lambda: client.get_wallet(wallet.walletId)),
+            ("get_wallets", lambda: client.get_wallets(api.PaginationParams(pageSize=10))),
+            ("create_wallet", client.create_wallet),
+            ("create_wallet_address", lambda: client.create_wallet_address(wallet.walletId, "USD", "ETH")),
+            ("get_wallet_addresses", lambda: client.get_wallet_addresses(wallet.walletId)),
+            ("create_transfer", lambda: client.create_transfer(source, destination, amount)),
+            ("get_transfer", lambda: client.get_transfer(transfer.id)),
+            ("get_transfers", lambda: client.get_transfers(api.PaginationParams(pageSize=50))),
+            ("create_subscription", lambda: client.create_subscription(endpoint)),
+            ("get_subscriptions", client.get_subscriptions),
+        ]
+        for name, fn in calls:
+            fn()
+            results.latency("calls." + name, timed(fn, args.calls))
+
+        ids = [s.id for s in client.get_subscriptions()]
+        histogram = api.Histogram()
+        for id in ids:
+            start = time.perf_counter()
+            client.delete_subscription(id)
+            histogram.record(time.perf_counter() - start)
+        results.latency("calls.delete_subscription", histogram)
+
+def bench_scan(results, args):
+    with stub_server("--transfers", args.scan_transfers) as url:
+        for name, kwargs, prefetch in (("eager", {}, False), ("lazy", { "lazy": True }, False), ("eager_prefetch", {}, True)):
+            with api.Client(url, "bench", **kwargs) as client:
+                start = time.perf_counter()
+                n = sum(1 for _ in client.iter_transfers(api.PaginationParams(pageSize=50), prefetch=prefetch))
+                elapsed = time.perf_counter() - start
+            results.add("scan.{}".format(name), n / elapsed, "transfers/s", better="higher", transfers=n, seconds=elapsed)
+
+def bench_create(results, args):
+    with stub_server("--transfers", 0, "--latency", args.create_latency) as url:
+        with api.Client(url, "bench") as client:
+            source = api.WalletLocation(client.get_configuration().payments.masterWalletId)
+        destination = api.BlockchainLocation("0x71715Da6ADa699e3a1a5C2664A55fF3D179c86EE", "ETH")
+        for concurrency in args.concurrency:
+            with api.Client(url, "bench", pool_maxsize=concurrency) as client:
+                items = [(source, destination, api.Money("0.01", "USD")) for _ in range(args.creates)]
+                start = time.perf_counter()
+                failed = sum(1 for r in client.create_transfers(items, concurrency=concurrency) if r.error is not None)
+                elapsed = time.perf_counter() - start
+            results.add("create.concurrency_{}".format(concurrency), args.creates / elapsed, "transfers/s",
+                    better="higher", failed=failed, latency=args.create_latency)
+
+def bench_parse(results, args):
+    pages = synthetic_pages(args.pages, args.page_size)
+    count = args.pages * args.page_size
+    decoded = [codec.loads(p) for p in pages]
+
+    results.add("parse.decode_{}".format(codec.backend), count / best_of(lambda: [codec.loads(p) for p in pages]),
+            "transfers/s", better="higher")
+    for model in (api.Transfer, api.LazyTransfer):
+        elapsed = best_of(lambda: [[model.from_json(t) for t in page["data"]] for page in decoded])
+        results.add("parse.from_json_{}".format(model.__name__), count / elapsed, "transfers/s", better="higher")
+
+        def touch_all():
+            for page in decoded:
+                for t in [model.from_json(t) for t in page["data"]]:
+                    t.id, t.status, t.source.type, t.destination.type, t.amount.amount
+        results.add("parse.from_json_{}_all_fields".format(model.__name__), count / best_of(touch_all), "transfers/s", better="higher")
+
+def bench_serialize(results, args):
+    transfers = [api.Transfer.from_json(transfer_json(i)) for i in range(args.serialize)]
+    per = lambda elapsed: elapsed / len(transfers) * 1e6
+
+    results.add("serialize.str", per(best_of(lambda: [str(t) for t in transfers])), "us/transfer")
+    results.add("serialize.json_dumps", per(best_of(lambda: [json.dumps(t, default=json_default) for t in transfers])), "us/transfer")
+    results.add("serialize.json_dumps_page", per(best_of(lambda: json.dumps(transfers, default=json_default))), "us/transfer")
+    results.add("serialize.to_json", per(best_of(lambda: [t.to_json() for t in transfers])), "us/transfer")
+
+def bench_startup_times(results, args):
+    cli, imported = bench_startup.import_times("cps_client.cli", args.startup_runs)
+    package, _ = bench_startup.import_times("cps_client.api", args.startup_runs)
+    results.add("startup.import_cli", statistics.median(cli), "ms",
+            deferred_imported=[m for m in bench_startup.DEFERRED if m in imported])
+    results.add("startup.import_api", statistics.median(package), "ms")
+    results.add("startup.help_wall", statistics.median(bench_startup.help_time(args.startup_runs)), "ms")
+
+BENCHMARKS = {
+    "calls": bench_calls,
+    "scan": bench_scan,
+    "create": bench_create,
+    "parse": bench_parse,
+    "serialize": bench_serialize,
+    "startup": bench_startup_times,
+}
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    try:
+        from importlib.metadata import version
+        package_version = version("cps_client")
+    except Exception:
+        package_version = None
+    return {
+        "version": package_version,
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "json_backend": codec.backend,
+        "date": datetime.now(timezone.utc).isoformat(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=None, help="file to write the results to as JSON")
+    parser.add_argument("--only", default=",".join(GROUPS), help="comma-separated groups to run")
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke test")
+    parser.add_argument("--calls", type=int, default=200, help="calls per method")
+    parser.add_argument("--scan-transfers", type=int, default=100000)
+    parser.add_argument("--creates", type=int, default=1000, help="transfers created per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--create-latency", type=float, default=0.005, help="seconds the stub takes per request")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--serialize", type=int, default=10000, help="transfers to serialize")
+    parser.add_argument("--startup-runs", type=int, default=10)
+    args = parser.parse_args()
+
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    if args.quick:
+        args.calls, args.scan_transfers, args.creates = 20, 2000, 100
+        args.pages, args.serialize, args.startup_runs = 2, 1000, 2
+    groups = args.only.split(",")
+    for group in groups:
+        if group not in BENCHMARKS:
+            parser.error("unknown group {!r}, expected some of {}".format(group, ", ".join(GROUPS)))
+
+    results = Results()
+    for group in groups:
+        BENCHMARKS[group](results, args)
+
+    if args.output is not None:
+        report = { "meta": metadata(), "config": { k: v for k, v in vars(args).items() if k != "output" }, "results": results.metrics }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
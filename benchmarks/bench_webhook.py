@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Notifications per second a NotificationReceiver accepts over localhost HTTP.
+
+Starts the receiver's standalone server, drains its queue with a consumer and posts SNS-shaped
+transfer notifications at it from concurrent keep-alive connections, a share of them repeated
+to exercise de-duplication. The senders run in --senders separate processes so they don't
+compete with the receiver for its event loop:
+
+    python benchmarks/bench_webhook.py --notifications 20000 --senders 4 --concurrency 32 --duplicates 0.1
+
+With --consumer-delay the consumer is slowed down to show backpressure: once the queue is full
+deliveries wait, then get 503s.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+import aiohttp
+
+from cps_client import api
+from cps_client.notifications import NotificationReceiver
+
+from bench_models import transfer_json
+
+
+def sns_body(i):
+    notification = {"clientId": "c0ffee", "notificationType": "transfers", "transfer": transfer_json(i)}
+    return json.dumps({
+        "Type": "Notification",
+        "MessageId": "message-{}".format(i),
+        "TopicArn": "arn:aws:sns:us-east-1:000000000000:cps",
+        "Message": json.dumps(notification),
+    }).encode()
+
+
+async def consume(receiver, delay):
+    async for _ in receiver:
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def post_all(url, bodies, concurrency):
+    latencies = api.Histogram()
+    statuses = {}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        pending = iter(bodies)
+
+        async def worker():
+            for body in pending:
+                start = time.perf_counter()
+                async with session.post(url, data=body) as res:
+                    await res.read()
+                latencies.record(time.perf_counter() - start)
+                statuses[res.status] = statuses.get(res.status, 0) + 1
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, statuses
+
+
+def sender(url, bodies, concurrency, results):
+    results.put(asyncio.run(post_all(url, bodies, concurrency)))
+
+
+async def run(args):
+    # the senders don't sign their messages as SNS does
+    receiver = NotificationReceiver(queue_size=args.queue_size, put_timeout=args.put_timeout, verify=False)
+    runner = await receiver.serve("127.0.0.1", 0)
+    port = runner.addresses[0][1]
+    consumer = asyncio.ensure_future(consume(receiver, args.consumer_delay))
+
+    unique = int(args.notifications * (1 - args.duplicates))
+    bodies = [sns_body(i) for i in range(unique)]
+    bodies += [bodies[random.randrange(unique)] for _ in range(args.notifications - unique)]
+    random.shuffle(bodies)
+
+    url = "http://127.0.0.1:{}/".format(port)
+    results = multiprocessing.Queue()
+    senders = [multiprocessing.Process(target=sender, args=(url, bodies[i::args.senders], args.concurrency, results))
+            for i in range(args.senders)]
+
+    start = time.perf_counter()
+    for p in senders:
+        p.start()
+    latencies = api.Histogram()
+    statuses = {}
+    loop = asyncio.get_running_loop()
+    for _ in senders:
+        # wait off the loop, which has deliveries to serve meanwhile
+        histogram, counts = await loop.run_in_executor(None, results.get)
+        latencies.merge(histogram)
+        for status, n in counts.items():
+            statuses[status] = statuses.get(status, 0) + n
+    elapsed = time.perf_counter() - start
+    for p in senders:
+        p.join()
+
+    consumer.cancel()
+    await runner.cleanup()
+
+    print("deliveries          {:10d}".format(len(bodies)))
+    print("deliveries/s        {:10.0f}".format(len(bodies) / elapsed))
+    print("latency p50 (ms)    {:10.2f}".format(latencies.percentile(50) * 1000))
+    print("latency p99 (ms)    {:10.2f}".format(latencies.percentile(99) * 1000))
+    print("statuses            {}".format(dict(sorted(statuses.items()))))
+    print("receiver            {}".format(receiver.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notifications", type=int, default=20000)
+    parser.add_argument("--senders", type=int, default=4, help="processes posting notifications")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per sender")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of deliveries that repeat an earlier one")
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--put-timeout", type=float, default=1.0)
+    parser.add_argument("--consumer-delay", type=float, default=0.0, help="seconds the consumer spends per notification")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
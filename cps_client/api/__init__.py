@@ -1,3 +1,32 @@
 from .api import *
 from .transfer import *
 from .wallet import *
+from .batch import TransferResult
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter, TokenBucket, FileTokenBucket
+from .cache import ResponseCache
+from .journal import IdempotencyJournal
+from .index import TransferIndex
+from .transport import RequestsTransport, RecordingTransport, ReplayTransport, CassetteMiss
+from .instrument import Instrument, RequestEvent, Histogram, MetricsCollector, TracingInstrument
+from .coalesce import SingleFlight, AsyncSingleFlight
+from .watcher import TransferWatcher, AsyncTransferWatcher
+
+# the asyncio client pulls in aiohttp and asyncio, which take longer to import than the rest of
+# the package together, so it's only loaded when first used
+_LAZY = {
+    "AsyncClient": "aio",
+    "aiter_pages": "aio",
+}
+
+# what `from cps_client.api import *` exports: everything public, the lazily loaded names too
+__all__ = [name for name in globals() if not name.startswith("_")] + list(_LAZY)
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        return getattr(importlib.import_module("." + _LAZY[name], __name__), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
@@ -0,0 +1,238 @@
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import asyncio
+
+from .api import BaseClient, ClientException, HttpException, PaginationParams, _cursor
+from .coalesce import AsyncSingleFlight
+from . import codec
+from . import batch
+
+
+async def aiter_pages(supplier, paginationParams, prefetch=False):
+    """Async counterpart of ``iter_pages``; supplier is a coroutine function.
+
+    With prefetch, the next page is requested as a task while the caller handles the current one.
+    """
+    def next_params(page):
+        return PaginationParams(pageSize=paginationParams.params["pageSize"], pageAfter=page[-1].page_after())
+
+    page = await supplier(paginationParams)
+    while len(page) > 0:
+        if not prefetch:
+            yield page
+            page = await supplier(next_params(page))
+            continue
+
+        pending = asyncio.ensure_future(supplier(next_params(page)))
+        try:
+            yield page
+        except GeneratorExit:
+            pending.cancel()
+            raise
+        page = await pending
+
+
+class AsyncClient(BaseClient):
+    """asyncio counterpart of ``Client`` backed by an aiohttp connection pool.
+
+    Requires the ``async`` extra: ``pip install cps-client[async]``.
+    """
+
+    _transport_errors = (aiohttp.ClientError, asyncio.TimeoutError) if aiohttp else ()
+
+    def __init__(self, host, creds, version="v1", limit=100, limit_per_host=0, keepalive_timeout=15, retry=None, rate_limiter=None, cache=None, coalesce=False, lazy=False, journal=None, instrument=None):
+        if aiohttp is None:
+            raise ImportError("AsyncClient requires aiohttp: pip install cps-client[async]")
+
+        BaseClient.__init__(self, host, creds, version, retry, rate_limiter, cache,
+                AsyncSingleFlight() if coalesce else None, lazy, journal, instrument)
+
+        # limit caps the connections open across all hosts and limit_per_host those to a
+        # single host (0 means no per-host cap). keepalive_timeout is how long, in
+        # seconds, an idle connection is kept in the pool.
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _session(self):
+        # the session binds to the running event loop, so it's created on first use
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, headers=self._default_headers())
+        return self.session
+
+    async def _request(self, call, headers=None, event=None):
+        async with self._session().request(
+                call.method,
+                call.resource,
+                data = self._encode(call.body),
+                # _merge_params already left out the None values aiohttp wouldn't drop
+                params = call.params or None,
+                headers = headers) as res:
+            self._check_status_code(res.status, res.headers)
+
+            body = await res.read()
+            if event is not None:
+                event.responded(res.status, len(body))
+
+            json_ = None
+            if call.parse is not None and res.status != 304:
+                json_ = codec.loads(body)
+                if event is not None:
+                    event.decoded()
+            return res.status, res.headers, json_
+
+    async def _send(self, call, headers=None, event=None):
+        attempt = 0
+        while True:
+            delay = self._throttle_delay(call)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                return await self._request(call, headers, event)
+            except (HttpException,) + self._transport_errors as e:
+                delay = self._retry_delay(call, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                if event is not None:
+                    event.retries = attempt
+
+    async def _fetch(self, call, entry, event=None):
+        status, headers, json_ = await self._send(call, self._conditional_headers(entry), event)
+        return self._cache_store(call, entry, status, headers, json_)
+
+    async def _call(self, call):
+        entry = self._cache_lookup(call)
+        if entry is not None and entry.fresh():
+            return call.parse(entry.json["data"])
+
+        key = self._journal_key(call)
+        if key is not None:
+            json_ = self.journal.lookup(key)
+            if json_ is not None:
+                return call.parse(json_["data"])
+            # begin blocks until the record is fsynced, so keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.journal.begin, key, call)
+
+        event = None
+
+        async def fetch():
+            nonlocal event
+            event = self._begin_event(call)
+            return await self._fetch(call, entry, event)
+
+        try:
+            if self.coalescer is not None and call.method == "GET":
+                # only the caller whose request goes out runs fetch, so waiters report no event
+                json_ = await self.coalescer.do(call.key(), fetch)
+            else:
+                json_ = await fetch()
+        except Exception as e:
+            if key is not None and isinstance(e, ClientException):
+                self.journal.reject(key, e.status_code)
+            self._end_event(event, e)
+            raise
+
+        if key is not None:
+            self.journal.complete(key, json_)
+
+        result = None
+        if call.parse is not None:
+            result = call.parse(json_["data"])
+            if event is not None:
+                event.built()
+        self._end_event(event)
+        return result
+
+    """ wallets """
+
+    async def create_wallet(self, idempotencyKey=None):
+        return await self._call(self._create_wallet(idempotencyKey))
+
+    async def get_wallet(self, walletId):
+        return await self._call(self._get_wallet(walletId))
+
+    async def get_wallets(self, *params):
+        return await self._call(self._get_wallets(*params))
+
+    async def iter_wallets(self, *params, prefetch=False):
+        filters, paginationParams = _cursor(params)
+        async for page in aiter_pages(lambda p: self.get_wallets(p, *filters), paginationParams, prefetch):
+            for wallet in page:
+                yield wallet
+
+    """ addresses """
+
+    async def create_wallet_address(self, walletId, currency, chain, idempotencyKey=None):
+        return await self._call(self._create_wallet_address(walletId, currency, chain, idempotencyKey))
+
+    async def get_wallet_addresses(self, walletId, *params):
+        return await self._call(self._get_wallet_addresses(walletId, *params))
+
+    async def iter_wallet_addresses(self, walletId, *params, prefetch=False):
+        filters, paginationParams = _cursor(params)
+        async for page in aiter_pages(lambda p: self.get_wallet_addresses(walletId, p, *filters), paginationParams, prefetch):
+            for address in page:
+                yield address
+
+    """ transfers """
+
+    async def create_transfer(self, source, destination, amount, idempotencyKey=None):
+        return await self._call(self._create_transfer(source, destination, amount, idempotencyKey))
+
+    def create_transfers(self, items, concurrency=8, rate=None, ordered=True):
+        """Submits many transfers concurrently; see ``batch.acreate_transfers``."""
+        return batch.acreate_transfers(self, items, concurrency, rate, ordered)
+
+    async def get_transfer(self, id):
+        return await self._call(self._get_transfer(id))
+
+    async def get_transfers(self, *params):
+        return await self._call(self._get_transfers(*params))
+
+    async def iter_transfers(self, *params, prefetch=False):
+        filters, paginationParams = _cursor(params)
+        async for page in aiter_pages(lambda p: self.get_transfers(p, *filters), paginationParams, prefetch):
+            for transfer in page:
+                yield transfer
+
+    async def resume_journal(self):
+        """Async counterpart of ``Client.resume_journal``."""
+        return [await self._call(call) for call in self._resumed_calls()]
+
+    """ configuration """
+
+    async def get_configuration(self):
+        return await self._call(self._get_configuration())
+
+    """ subscriptions """
+
+    async def create_subscription(self, endpoint):
+        return await self._call(self._create_subscription(endpoint))
+
+    async def get_subscriptions(self):
+        return await self._call(self._get_subscriptions())
+
+    async def delete_subscription(self, id):
+        await self._call(self._delete_subscription(id))
@@ -1,17 +1,28 @@
-import json
-import uuid
 import re
-
-import requests
-
-from .wallet import Wallet, Address, CreateWalletRequest, CreateAddressRequest
-from .transfer import Transfer
+import time
+from datetime import datetime, timezone
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from .wallet import Wallet, LazyWallet, Address, CreateWalletRequest, CreateAddressRequest
+from .model import json_default, idempotency_key
+from .transfer import Transfer, LazyTransfer
 from .configuration import Configuration
 from .subscription import Subscription, CreateSubscriptionRequest
+from .coalesce import SingleFlight
+from . import codec
+from . import batch
+from . import backfill
+from .journal import JournaledRequest
+from .instrument import RequestEvent
+from .transport import RequestsTransport
 
 class HttpException(Exception):
-    def __init__(self, status_code):
+    def __init__(self, status_code, retry_after=None):
         self.status_code = status_code
+        # seconds the server asked us to wait before trying again, if it said
+        self.retry_after = retry_after
 
 class ClientException(HttpException):
     pass
@@ -20,8 +31,9 @@ class ServerException(HttpException):
     pass
 
 class CreateTransferRequest:
-    def __init__(self, source, destination, amount):
-        self.idempotencyKey = str(uuid.uuid4())
+    def __init__(self, source, destination, amount, idempotencyKey=None):
+        # reuse the key of a previous attempt to resubmit it without creating a duplicate
+        self.idempotencyKey = idempotencyKey or idempotency_key()
         self.source = source
         self.destination = destination
         self.amount = amount
@@ -48,9 +60,54 @@ class PaginationParams:
     def get_params(self):
         return self.params
 
+def _cursor(params):
+    """Splits params into the caller's filters and a fresh PaginationParams to walk pages with."""
+    filters = []
+    pageSize, pageAfter = 50, None
+    for p in params:
+        if isinstance(p, PaginationParams):
+            if p.params["pageBefore"] is not None:
+                raise ValueError("pagination iterators only follow pageAfter cursors")
+            pageSize, pageAfter = p.params["pageSize"], p.params["pageAfter"]
+        else:
+            filters.append(p)
+    return filters, PaginationParams(pageSize=pageSize, pageAfter=pageAfter)
+
+def iter_pages(supplier, paginationParams, prefetch=False):
+    """Yields pages from supplier, following page_after() cursors until a page comes back empty.
+
+    supplier is called with a new PaginationParams for every page so it is never mutated while
+    a request is in flight. With prefetch, the next page is fetched on a background thread while
+    the caller handles the current one, so at most two pages are held at a time.
+    """
+    def next_params(page):
+        return PaginationParams(pageSize=paginationParams.params["pageSize"], pageAfter=page[-1].page_after())
+
+    if not prefetch:
+        page = supplier(paginationParams)
+        while len(page) > 0:
+            yield page
+            page = supplier(next_params(page))
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = supplier(paginationParams)
+        while len(page) > 0:
+            pending = executor.submit(supplier, next_params(page))
+            try:
+                yield page
+            except GeneratorExit:
+                pending.cancel()
+                raise
+            page = pending.result()
+
 class DateTimeParams:
     regex = r'^(-?(?:[1-9][0-9]*)?[0-9]{4})-(1[0-2]|0[1-9])-(3[01]|0[1-9]|[12][0-9])T(2[0-3]|[01][0-9]):([0-5][0-9]):([0-5][0-9])(\.[0-9]+)?(Z|[+-](?:2[0-3]|[01][0-9]):[0-5][0-9])?$'
-    match_iso8601 = re.compile(regex).match
+
+    @staticmethod
+    def match_iso8601(value):
+        # compiled on first use, and cached by re, rather than when the package is imported
+        return re.match(DateTimeParams.regex, value)
 
     def __init__(self, from_=None, to=None):
         if from_ is not None:
@@ -77,172 +134,418 @@ class TransferParams:
     def get_params(self):
         return self.params
 
-class Client:
-    def __init__(self, host, creds, version="v1"):
+class _Call(namedtuple("_Call", ["name", "method", "resource", "params", "body", "parse"])):
+    __slots__ = ()
+
+    def key(self):
+        """Identifies the response: two GETs with the same key are interchangeable."""
+        params = ()
+        if self.params:
+            params = tuple(sorted((k, str(v)) for k, v in self.params.items() if v is not None))
+        return (self.resource, params)
+
+# resource of each call with its ids left as placeholders, to build its URL and to group metrics
+# by endpoint
+_TEMPLATES = {
+    "create_wallet": "/wallets",
+    "get_wallet": "/wallets/{walletId}",
+    "get_wallets": "/wallets",
+    "create_wallet_address": "/wallets/{walletId}/addresses",
+    "get_wallet_addresses": "/wallets/{walletId}/addresses",
+    "create_transfer": "/transfers",
+    "get_transfer": "/transfers/{id}",
+    "get_transfers": "/transfers",
+    "get_configuration": "/configuration",
+    "create_subscription": "/notifications/subscriptions",
+    "get_subscriptions": "/notifications/subscriptions",
+    "delete_subscription": "/notifications/subscriptions/{id}",
+}
+
+def _url_format(template):
+    """template as a str.format string taking its ids positionally, e.g. "/wallets/{}/addresses"."""
+    return "/".join("{}" if part.startswith("{") else part for part in template.split("/"))
+
+def _many(from_json):
+    return lambda data: [from_json(d) for d in data]
+
+class BaseClient:
+    """Describes every CPS call once so the sync and async clients can't drift.
+
+    Each ``_<name>`` method returns a ``_Call`` named after the public method, with the
+    request to make and the function that turns the response's ``data`` into models. ``Client`` and ``AsyncClient`` only
+    differ in how they execute it.
+    """
+
+    def __init__(self, host, creds, version="v1", retry=None, rate_limiter=None, cache=None, coalescer=None, lazy=False, journal=None, instrument=None):
         self.host = host
         self.creds = creds
         self.version = version
-
-    def _default_headers(self):
-        return {
+        # list endpoints return LazyTransfer/LazyWallet, which build fields on first access
+        self.lazy = lazy
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        # collapses concurrent identical GETs when set, see coalesce.SingleFlight
+        self.coalescer = coalescer
+        # write-ahead log of creates, see journal.IdempotencyJournal
+        self.journal = journal
+        # receives a RequestEvent per call that goes to the network, see instrument.Instrument
+        self.instrument = instrument
+
+        # every call's URL and the headers of every request only depend on the arguments above,
+        # so they're built once here rather than on each call
+        base = "/".join([host, version])
+        self._urls = { name: base + _url_format(template) for name, template in _TEMPLATES.items() }
+        self._headers = {
             "Content-Type": "application/json",
-            "Authorization": "Bearer " + self.creds
+            "Authorization": "Bearer " + creds
         }
 
+    def _default_headers(self):
+        """The headers every request carries. Shared between calls, so never modified."""
+        return self._headers
+
+    def _url(self, name, *ids):
+        url = self._urls[name]
+        return url.format(*ids) if ids else url
+
+    @staticmethod
+    def _merge_params(params):
+        """Merges the query params of params, later ones winning, in a single pass. A param that
+        ends up None is left out, so transports don't have to filter it."""
+        qparams = {}
+        for p in params:
+            for k, v in p.get_params().items():
+                if v is None:
+                    qparams.pop(k, None)
+                else:
+                    qparams[k] = v
+        return qparams
+
+    @staticmethod
+    def _encode(body):
+        if body is None:
+            return None
+        return codec.dumps(body, default=json_default)
+
+    @staticmethod
+    def _retry_after(headers):
+        value = headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        # email.utils is slow to import and HTTP-dates are rare here
+        from email.utils import parsedate_to_datetime
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _check_status_code(status_code, headers=None):
+        if (status_code >= HTTPStatus.INTERNAL_SERVER_ERROR):
+            raise ServerException(status_code, BaseClient._retry_after(headers or {}))
+        elif (status_code >= HTTPStatus.BAD_REQUEST):
+            raise ClientException(status_code, BaseClient._retry_after(headers or {}))
+
+    def _throttle_delay(self, call):
+        if self.rate_limiter is None:
+            return 0.0
+        return self.rate_limiter.reserve(call.method, call.resource)
+
+    def _retry_delay(self, call, error, attempt):
+        if self.retry is None:
+            return None
+        return self.retry.delay(call, error, attempt)
+
+    def _cache_lookup(self, call):
+        if self.cache is None:
+            return None
+        return self.cache.get(call)
+
     @staticmethod
-    def __check_status_code(res):
-        if (res.status_code >= requests.codes.internal_server_error):
-            raise ServerException(res.status_code)
-        elif (res.status_code >= requests.codes.bad_request):
-            raise ClientException(res.status_code)
+    def _conditional_headers(entry):
+        if entry is None or entry.etag is None:
+            return None
+        return { "If-None-Match": entry.etag }
+
+    def _cache_store(self, call, entry, status_code, headers, json_):
+        """Caches a response and returns the JSON to parse, which is the cached one on a 304."""
+        if self.cache is None:
+            return json_
+
+        if status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+            self.cache.revalidated(call, entry)
+            return entry.json
+
+        if json_ is not None:
+            self.cache.put(call, json_, headers.get("ETag"))
+        self.cache.written(call)
+        return json_
+
+    def _begin_event(self, call):
+        if self.instrument is None:
+            return None
+        template = "/" + self.version + _TEMPLATES.get(call.name, "")
+        event = RequestEvent(call.name, call.method, template, call.resource)
+        self.instrument.request_start(event)
+        return event
+
+    def _end_event(self, event, error=None):
+        if event is None:
+            return
+        event.finish(error)
+        self.instrument.request_end(event)
+
+    def _journal_key(self, call):
+        """The idempotency key to journal call under, or None if it isn't journaled."""
+        if self.journal is None or call.method != "POST":
+            return None
+        return getattr(call.body, "idempotencyKey", None)
+
+    def _resumed_calls(self):
+        """Calls resending the journal's pending creates as they were first sent."""
+        parsers = {
+            "create_wallet": Wallet.from_json,
+            "create_wallet_address": Address.from_json,
+            "create_transfer": Transfer.from_json,
+        }
+        return [_Call(req["name"], "POST", req["resource"], None, JournaledRequest(req["body"]), parsers[req["name"]])
+                for _, req in self.journal.pending()]
 
     """ wallets """
 
-    def create_wallet(self):
-        req = CreateWalletRequest()
-        resource = "/".join([self.host, self.version, "wallets"])
+    def _create_wallet(self, idempotencyKey=None):
+        req = CreateWalletRequest(idempotencyKey)
+        return _Call("create_wallet", "POST", self._url("create_wallet"), None, req, Wallet.from_json)
 
-        res = requests.post(
-                resource,
-                data = json.dumps(req, default=lambda o: o.__dict__),
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    def _get_wallet(self, walletId):
+        return _Call("get_wallet", "GET", self._url("get_wallet", walletId), None, None, Wallet.from_json)
 
-        return Wallet.from_json(res.json()["data"])
+    def _get_wallets(self, *params):
+        return _Call("get_wallets", "GET", self._url("get_wallets"), self._merge_params(params), None, _many(LazyWallet.from_json if self.lazy else Wallet.from_json))
 
-    def get_wallet(self, walletId):
-        resource = "/".join([self.host, self.version, "wallets", walletId])
+    """ addresses """
 
-        res = requests.get(
-                resource,
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    def _create_wallet_address(self, walletId, currency, chain, idempotencyKey=None):
+        req = CreateAddressRequest(currency, chain, idempotencyKey)
+        return _Call("create_wallet_address", "POST", self._url("create_wallet_address", walletId), None, req, Address.from_json)
 
-        return Wallet.from_json(res.json()["data"])
+    def _get_wallet_addresses(self, walletId, *params):
+        return _Call("get_wallet_addresses", "GET", self._url("get_wallet_addresses", walletId), self._merge_params(params), None, _many(Address.from_json))
 
-    def get_wallets(self, *params):
-        resource = "/".join([self.host, self.version, "wallets"])
+    """ transfers """
 
-        qparams = dict()
-        for p in params:
-            qparams = { **qparams, **p.get_params() }
+    def _create_transfer(self, source, destination, amount, idempotencyKey=None):
+        req = CreateTransferRequest(source, destination, amount, idempotencyKey)
+        return _Call("create_transfer", "POST", self._url("create_transfer"), None, req, Transfer.from_json)
 
-        res = requests.get(
-                resource,
-                headers = self._default_headers(),
-                params = qparams)
-        Client.__check_status_code(res)
+    def _get_transfer(self, id):
+        return _Call("get_transfer", "GET", self._url("get_transfer", id), None, None, Transfer.from_json)
 
-        return [Wallet.from_json(w) for w in res.json()["data"]]
+    def _get_transfers(self, *params):
+        return _Call("get_transfers", "GET", self._url("get_transfers"), self._merge_params(params), None, _many(LazyTransfer.from_json if self.lazy else Transfer.from_json))
 
-    """ addresses """
+    """ configuration """
 
-    def create_wallet_address(self, walletId, currency, chain):
-        req = CreateAddressRequest(currency, chain)
-        resource = "/".join([self.host, self.version, "wallets", walletId, "addresses"])
+    def _get_configuration(self):
+        return _Call("get_configuration", "GET", self._url("get_configuration"), None, None, Configuration.from_json)
 
-        res = requests.post(
-                resource,
-                data = json.dumps(req, default=lambda o: o.__dict__),
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    """ subscriptions """
 
-        return Address.from_json(res.json()["data"])
+    def _create_subscription(self, endpoint):
+        req = CreateSubscriptionRequest(endpoint)
+        return _Call("create_subscription", "POST", self._url("create_subscription"), None, req, Subscription.from_json)
 
-    def get_wallet_addresses(self, walletId, *params):
-        resource = "/".join([self.host, self.version, "wallets", walletId, "addresses"])
+    def _get_subscriptions(self):
+        return _Call("get_subscriptions", "GET", self._url("get_subscriptions"), None, None, _many(Subscription.from_json))
 
-        qparams = dict()
-        for p in params:
-            qparams = { **qparams, **p.get_params() }
+    def _delete_subscription(self, id):
+        return _Call("delete_subscription", "DELETE", self._url("delete_subscription", id), None, None, None)
 
-        res = requests.get(
-                resource,
-                headers = self._default_headers(),
-                params = qparams)
-        Client.__check_status_code(res)
+class Client(BaseClient):
 
-        return [Address.from_json(a) for a in res.json()["data"]]
+    def __init__(self, host, creds, version="v1", pool_connections=10, pool_maxsize=10, keepalive_timeout=None, retry=None, rate_limiter=None, cache=None, coalesce=False, lazy=False, journal=None, instrument=None, transport=None, pool_block=False):
+        BaseClient.__init__(self, host, creds, version, retry, rate_limiter, cache,
+                SingleFlight() if coalesce else None, lazy, journal, instrument)
 
-    """ transfers """
+        # sends the requests, see transport.RequestsTransport, which the pool options configure,
+        # or RecordingTransport and ReplayTransport to work from cassettes
+        if transport is None:
+            transport = RequestsTransport(pool_connections, pool_maxsize, keepalive_timeout, pool_block)
+        self.transport = transport
+        self._transport_errors = transport.errors
 
-    def create_transfer(self, source, destination, amount):
-        req = CreateTransferRequest(source, destination, amount)
-        resource = "/".join([self.host, self.version, "transfers"])
+    def __enter__(self):
+        return self
 
-        res = requests.post(
-                resource,
-                data = json.dumps(req, default=lambda o: o.__dict__),
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    def __exit__(self, *exc):
+        self.close()
 
-        return Transfer.from_json(res.json()["data"])
+    def close(self):
+        self.transport.close()
 
-    def get_transfer(self, id):
-        resource = "/".join([self.host, self.version, "transfers", id])
+    def _request(self, method, resource, params=None, body=None, headers=None):
+        if headers:
+            headers = { **self._default_headers(), **headers }
+        else:
+            headers = self._default_headers()
 
-        res = requests.get(
+        res = self.transport.send(
+                method,
                 resource,
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+                params = params,
+                data = self._encode(body),
+                headers = headers)
+        self._check_status_code(res.status_code, res.headers)
+
+        return res
+
+    def _send(self, call, headers=None, event=None):
+        attempt = 0
+        while True:
+            delay = self._throttle_delay(call)
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                return self._request(call.method, call.resource, params=call.params, body=call.body, headers=headers)
+            except (HttpException,) + self._transport_errors as e:
+                delay = self._retry_delay(call, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                if event is not None:
+                    event.retries = attempt
+
+    def _fetch(self, call, entry, event=None):
+        res = self._send(call, self._conditional_headers(entry), event)
+        if event is not None:
+            event.responded(res.status_code, len(res.content))
+
+        json_ = None
+        if call.parse is not None and res.status_code != HTTPStatus.NOT_MODIFIED:
+            json_ = codec.loads(res.content)
+            if event is not None:
+                event.decoded()
+        return self._cache_store(call, entry, res.status_code, res.headers, json_)
+
+    def _call(self, call):
+        entry = self._cache_lookup(call)
+        if entry is not None and entry.fresh():
+            return call.parse(entry.json["data"])
+
+        key = self._journal_key(call)
+        if key is not None:
+            json_ = self.journal.lookup(key)
+            if json_ is not None:
+                return call.parse(json_["data"])
+            self.journal.begin(key, call)
+
+        event = None
+
+        def fetch():
+            nonlocal event
+            event = self._begin_event(call)
+            return self._fetch(call, entry, event)
+
+        try:
+            if self.coalescer is not None and call.method == "GET":
+                # only the caller whose request goes out runs fetch, so waiters report no event
+                json_ = self.coalescer.do(call.key(), fetch)
+            else:
+                json_ = fetch()
+        except Exception as e:
+            if key is not None and isinstance(e, ClientException):
+                self.journal.reject(key, e.status_code)
+            self._end_event(event, e)
+            raise
+
+        if key is not None:
+            self.journal.complete(key, json_)
+
+        result = None
+        if call.parse is not None:
+            result = call.parse(json_["data"])
+            if event is not None:
+                event.built()
+        self._end_event(event)
+        return result
 
-        return Transfer.from_json(res.json()["data"])
+    """ wallets """
 
-    def get_transfers(self, *params):
-        resource = "/".join([self.host, self.version, "transfers"])
+    def create_wallet(self, idempotencyKey=None):
+        return self._call(self._create_wallet(idempotencyKey))
 
-        qparams = dict()
-        for p in params:
-            qparams = { **qparams, **p.get_params() }
+    def get_wallet(self, walletId):
+        return self._call(self._get_wallet(walletId))
 
-        res = requests.get(
-                resource,
-                headers = self._default_headers(),
-                params = qparams)
-        Client.__check_status_code(res)
+    def get_wallets(self, *params):
+        return self._call(self._get_wallets(*params))
 
-        return [Transfer.from_json(t) for t in res.json()["data"]]
+    def iter_wallets(self, *params, prefetch=False):
+        filters, paginationParams = _cursor(params)
+        for page in iter_pages(lambda p: self.get_wallets(p, *filters), paginationParams, prefetch):
+            yield from page
 
-    """ configuration """
+    """ addresses """
 
-    def get_configuration(self):
-        resource = "/".join([self.host, self.version, "configuration"])
+    def create_wallet_address(self, walletId, currency, chain, idempotencyKey=None):
+        return self._call(self._create_wallet_address(walletId, currency, chain, idempotencyKey))
 
-        res = requests.get(
-                resource,
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    def get_wallet_addresses(self, walletId, *params):
+        return self._call(self._get_wallet_addresses(walletId, *params))
 
-        return Configuration.from_json(res.json()["data"])
+    def iter_wallet_addresses(self, walletId, *params, prefetch=False):
+        filters, paginationParams = _cursor(params)
+        for page in iter_pages(lambda p: self.get_wallet_addresses(walletId, p, *filters), paginationParams, prefetch):
+            yield from page
 
-    """ subscriptions """
+    """ transfers """
 
-    def create_subscription(self, endpoint):
-        req = CreateSubscriptionRequest(endpoint)
-        resource = "/".join([self.host, self.version, "notifications/subscriptions"])
+    def create_transfer(self, source, destination, amount, idempotencyKey=None):
+        return self._call(self._create_transfer(source, destination, amount, idempotencyKey))
 
-        res = requests.post(
-                resource,
-                data = json.dumps(req, default=lambda o: o.__dict__),
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    def create_transfers(self, items, concurrency=8, rate=None, ordered=True):
+        """Submits many transfers concurrently; see ``batch.create_transfers``."""
+        return batch.create_transfers(self, items, concurrency, rate, ordered)
 
-        return Subscription.from_json(res.json()["data"])
+    def get_transfer(self, id):
+        return self._call(self._get_transfer(id))
 
-    def get_subscriptions(self):
-        resource = "/".join([self.host, self.version, "notifications/subscriptions"])
+    def get_transfers(self, *params):
+        return self._call(self._get_transfers(*params))
 
-        res = requests.get(
-                resource,
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    def iter_transfers(self, *params, prefetch=False):
+        filters, paginationParams = _cursor(params)
+        for page in iter_pages(lambda p: self.get_transfers(p, *filters), paginationParams, prefetch):
+            yield from page
 
-        return [Subscription.from_json(s) for s in res.json()["data"]]
+    def iter_transfers_backfill(self, from_, to, *params, workers=4, **kwargs):
+        """Pages time windows of [from_, to] concurrently; see ``backfill.iter_transfers_backfill``."""
+        return backfill.iter_transfers_backfill(self, from_, to, *params, workers=workers, **kwargs)
 
-    def delete_subscription(self, id):
-        resource = "/".join([self.host, self.version, "notifications/subscriptions", id])
+    def resume_journal(self):
+        """Resends every create in the journal that has no recorded response, with its original
+        idempotency key, and returns what they created."""
+        return [self._call(call) for call in self._resumed_calls()]
 
-        res = requests.delete(
-                resource,
-                headers = self._default_headers())
-        Client.__check_status_code(res)
+    """ configuration """
+
+    def get_configuration(self):
+        return self._call(self._get_configuration())
+
+    """ subscriptions """
+
+    def create_subscription(self, endpoint):
+        return self._call(self._create_subscription(endpoint))
+
+    def get_subscriptions(self):
+        return self._call(self._get_subscriptions())
+
+    def delete_subscription(self, id):
+        self._call(self._delete_subscription(id))
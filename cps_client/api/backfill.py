@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from . import api
+
+
+def parse_datetime(value):
+    """Parses the ISO-8601 date-times CPS uses, e.g. 2020-04-10T02:13:30.000Z."""
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+def format_datetime(dt):
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+class _Windows:
+    """Cuts [start, end] into consecutive windows, newest first, resizing them as it learns how
+    many transfers a window holds."""
+
+    def __init__(self, start, end, size, min_size, max_size, target):
+        self.start = start
+        self.next_end = end
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target = target
+
+    def next(self):
+        if self.next_end <= self.start:
+            return None
+        end = self.next_end
+        start = max(self.start, end - self.size)
+        self.next_end = start
+        return start, end
+
+    def observed(self, start, end, count):
+        if count == 0:
+            size = self.size * 2
+        else:
+            size = (end - start) * (self.target / count)
+        self.size = min(self.max_size, max(self.min_size, size))
+
+def _page_window(client, start, end, pageSize, filters):
+    transfers = []
+    window = api.DateTimeParams(format_datetime(start), format_datetime(end))
+    paginationParams = api.PaginationParams(pageSize=pageSize)
+    while True:
+        page = client.get_transfers(paginationParams, window, *filters)
+        if len(page) == 0:
+            return transfers
+        transfers += page
+        paginationParams.set_page_after(page[-1].page_after())
+
+def iter_transfers_backfill(client, from_, to, *filters, workers=4, window=timedelta(hours=1),
+        min_window=timedelta(seconds=1), max_window=timedelta(days=7), target=500, pageSize=50):
+    """Yields every transfer created between from_ and to, newest first like ``get_transfers``.
+
+    The range is cut into windows that are paged concurrently by workers threads. Results are
+    still yielded in order, window by window, and a transfer created exactly on the boundary of
+    two windows (both ends are inclusive) is only yielded once. Window sizes start at window and
+    adapt so each holds about target transfers. At most workers windows are held in memory.
+
+    filters are extra params for ``get_transfers``, e.g. a TransferParams.
+    """
+    windows = _Windows(parse_datetime(from_), parse_datetime(to), window, min_window, max_window, target)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        def schedule():
+            while len(pending) < workers:
+                w = windows.next()
+                if w is None:
+                    return
+                pending.append((w, executor.submit(_page_window, client, w[0], w[1], pageSize, filters)))
+
+        # ids of the previous window's transfers created right on its start, the only ones that
+        # can repeat
+        edge = set()
+        schedule()
+        while pending:
+            (start, end), future = pending.popleft()
+            transfers = future.result()
+            windows.observed(start, end, len(transfers))
+            schedule()
+
+            for t in transfers:
+                if t.id not in edge:
+                    yield t
+
+            # the windows are queried to the millisecond, so that's what the boundary is shared at
+            boundary = parse_datetime(format_datetime(start))
+            edge = set()
+            for t in reversed(transfers):
+                if parse_datetime(t.createDate) > boundary:
+                    break
+                edge.add(t.id)
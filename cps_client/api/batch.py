@@ -0,0 +1,125 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import api
+from .ratelimit import TokenBucket
+
+
+class TransferResult:
+    """Outcome of one item of a batch.
+
+    ``request`` always carries the ``idempotencyKey`` that was sent, so failed items can be
+    resubmitted as-is without risking a double payment.
+    """
+
+    def __init__(self, index, request, transfer=None, error=None):
+        self.index = index
+        self.request = request
+        self.transfer = transfer
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "TransferResult({}, {}, transfer={})".format(self.index, self.request.idempotencyKey, self.transfer.id)
+        return "TransferResult({}, {}, error={!r})".format(self.index, self.request.idempotencyKey, self.error)
+
+def as_request(item):
+    """Accepts a CreateTransferRequest or a (source, destination, amount) tuple."""
+    if isinstance(item, api.CreateTransferRequest):
+        return item
+    source, destination, amount = item
+    return api.CreateTransferRequest(source, destination, amount)
+
+def _finished(pending, ordered):
+    """Takes the next results' futures off pending: the oldest one if ordered, otherwise every
+    one that has finished, waiting for the first if none has."""
+    if ordered:
+        return [pending.popleft()]
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for f in done:
+        pending.remove(f)
+    return done
+
+async def _afinished(pending, ordered):
+    import asyncio
+
+    if ordered:
+        return [pending.popleft()]
+    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    for f in done:
+        pending.remove(f)
+    return done
+
+def create_transfers(client, items, concurrency=8, rate=None, ordered=True):
+    """Submits transfers with at most concurrency in flight and at most rate started per second.
+
+    Yields a TransferResult per item as they finish, in input order unless ordered is False.
+    Items are consumed lazily, so only about 2 * concurrency of them are held at a time. The
+    client's pool_maxsize should be at least concurrency to keep every worker on a live
+    connection.
+    """
+    bucket = TokenBucket(rate, burst=1) if rate else None
+
+    def submit(index, req):
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            transfer = client.create_transfer(req.source, req.destination, req.amount, req.idempotencyKey)
+            return TransferResult(index, req, transfer=transfer)
+        except (api.HttpException,) + client._transport_errors as e:
+            return TransferResult(index, req, error=e)
+
+    window = 2 * concurrency
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for index, item in enumerate(items):
+            pending.append(executor.submit(submit, index, as_request(item)))
+            if len(pending) >= window:
+                for f in _finished(pending, ordered):
+                    yield f.result()
+
+        while pending:
+            for f in _finished(pending, ordered):
+                yield f.result()
+
+async def acreate_transfers(client, items, concurrency=8, rate=None, ordered=True):
+    """Async counterpart of ``create_transfers`` for an ``AsyncClient``."""
+    import asyncio
+
+    bucket = TokenBucket(rate, burst=1) if rate else None
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def submit(index, req):
+        async with semaphore:
+            if bucket is not None:
+                delay = bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            try:
+                transfer = await client.create_transfer(req.source, req.destination, req.amount, req.idempotencyKey)
+                return TransferResult(index, req, transfer=transfer)
+            except (api.HttpException,) + client._transport_errors as e:
+                return TransferResult(index, req, error=e)
+
+    window = 2 * concurrency
+    pending = deque()
+    try:
+        for index, item in enumerate(items):
+            pending.append(asyncio.ensure_future(submit(index, as_request(item))))
+            if len(pending) >= window:
+                for f in await _afinished(pending, ordered):
+                    yield await f
+
+        while pending:
+            for f in await _afinished(pending, ordered):
+                yield await f
+    finally:
+        for f in pending:
+            f.cancel()
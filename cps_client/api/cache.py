@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    def __init__(self, json_, etag, expires):
+        self.json = json_
+        self.etag = etag
+        self.expires = expires
+
+    def fresh(self):
+        return time.monotonic() < self.expires
+
+class ResponseCache:
+    """LRU cache of GET responses with a TTL per client method.
+
+    ttls maps a client method name to how many seconds its responses stay fresh; methods not
+    listed aren't cached. Stale entries are kept while they have an ETag, so the next call can
+    revalidate with If-None-Match and skip the body on a 304. At most maxsize responses are
+    kept. Entries hold the decoded JSON rather than models, so every hit returns new objects.
+
+    Creating a transfer invalidates the cached source and destination wallets; anything else
+    can be dropped with ``invalidate``, ``invalidate_wallet`` or ``clear``.
+    """
+
+    DEFAULT_TTLS = {
+        "get_configuration": 300,
+        "get_wallet": 5,
+    }
+
+    def __init__(self, ttls=None, maxsize=1024):
+        self.ttls = dict(ResponseCache.DEFAULT_TTLS if ttls is None else ttls)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, call):
+        """Returns the entry for call, fresh or stale, or None."""
+        if call.method != "GET" or call.name not in self.ttls:
+            return None
+
+        key = call.key()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if entry.fresh():
+                self.hits += 1
+            return entry
+
+    def put(self, call, json_, etag=None):
+        ttl = self.ttls.get(call.name)
+        if call.method != "GET" or ttl is None:
+            return
+
+        key = call.key()
+        with self._lock:
+            self._entries[key] = CacheEntry(json_, etag, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def revalidated(self, call, entry):
+        """Marks entry fresh again after the server answered 304 Not Modified."""
+        with self._lock:
+            self.revalidations += 1
+            entry.expires = time.monotonic() + self.ttls[call.name]
+
+    def invalidate(self, resource):
+        """Drops every cached response for resource, whatever its query params."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == resource]:
+                del self._entries[key]
+
+    def invalidate_wallet(self, walletId):
+        with self._lock:
+            suffix = "/wallets/" + walletId
+            for key in [k for k in self._entries if k[0].endswith(suffix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def written(self, call):
+        """Invalidates whatever a successful write made stale."""
+        if call.name == "create_transfer":
+            for location in (call.body.source, call.body.destination):
+                if getattr(location, "type", None) == "wallet":
+                    self.invalidate_wallet(location.id)
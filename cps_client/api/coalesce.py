@@ -0,0 +1,73 @@
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Collapses concurrent identical calls from threads into one.
+
+    The first caller for a key runs the function; callers arriving while it's in flight wait and
+    get the same result, or the same exception. ``calls`` counts every call and ``coalesced``
+    those that were answered by another caller's request.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for tasks on one event loop; fn is a coroutine function."""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+
+    async def do(self, key, fn):
+        # only ever called from a running loop, so asyncio is already loaded by then; importing
+        # it at the top would slow down every sync import of the package
+        import asyncio
+
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            # shield so a waiter being cancelled doesn't cancel everyone else's request
+            return await asyncio.shield(flight)
+
+        flight = self._flights[key] = asyncio.ensure_future(fn())
+        flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(flight)
@@ -0,0 +1,47 @@
+"""JSON encoding for request and response bodies.
+
+Uses orjson, then ujson, when one is installed, since decoding list pages is a large share of
+the time spent in the client; falls back to the standard library otherwise. ``backend`` names
+the one in use.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+if orjson is not None:
+    backend = "orjson"
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj, default=None):
+        return orjson.dumps(obj, default=default)
+
+elif ujson is not None:
+    backend = "ujson"
+
+    def loads(data):
+        return ujson.loads(data)
+
+    def dumps(obj, default=None):
+        # ujson has no default hook, so only the standard library can serialize models
+        return json.dumps(obj, default=default)
+
+else:
+    backend = "json"
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj, default=None):
+        return json.dumps(obj, default=default)
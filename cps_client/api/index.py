@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import OrderedDict
+
+from . import codec
+from .api import DateTimeParams, HttpException, PaginationParams
+from .cache import CacheEntry
+from .model import Model
+from .transfer import Transfer
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfer_index (
+    id TEXT PRIMARY KEY,
+    status TEXT,
+    createDate TEXT,
+    json TEXT,
+    etag TEXT,
+    updated REAL,
+    confirmed INTEGER
+);
+CREATE INDEX IF NOT EXISTS transfer_index_status ON transfer_index (status);
+"""
+
+_UNSETTLED = "SELECT {} FROM transfer_index WHERE NOT (confirmed AND status IN (?, ?))"
+
+
+def transfer_json(transfer):
+    """The API JSON of a Transfer model, as get_transfer returns it."""
+    json_ = getattr(transfer, "_json", None)
+    if json_ is not None:
+        return json_
+
+    def plain(o):
+        if isinstance(o, Model):
+            return { name: plain(value) for name, value in o.to_json().items() }
+        return o
+    return plain(transfer)
+
+class IndexEntry(CacheEntry):
+    """A transfer in the index. confirmed is whether its state came from CPS rather than a
+    notification. A transfer CPS says has a final status is settled, and always fresh, as it
+    can't change any more; any other is fresh until ttl seconds after it was last updated."""
+
+    def __init__(self, json_, etag, updated, ttl, confirmed=True):
+        CacheEntry.__init__(self, { "data": json_ }, etag, updated + ttl)
+        self.status = json_.get("status")
+        self.createDate = json_.get("createDate")
+        self.updated = updated
+        self.confirmed = confirmed
+
+    def final(self):
+        return self.status in Transfer.FINAL_STATUSES
+
+    def settled(self):
+        return self.confirmed and self.final()
+
+    def fresh(self):
+        return self.settled() or time.time() < self.expires
+
+class TransferIndex:
+    """Local index of transfer states, kept current by notifications, to answer get_transfer
+    without a request.
+
+    Pass it to a client as its cache. get_transfer is then answered from the index while the
+    transfer's entry is fresh (see ``IndexEntry``) and from CPS otherwise, which also updates the
+    index, as do get_transfers and create_transfer responses. Calls for anything but transfers go
+    to cache, a ``ResponseCache``, if one is given.
+
+    Only CPS is trusted for good: its responses always replace an entry, and a final status it
+    returned is kept for good. A notification's status, final or not, is only fresh for ttl
+    seconds, until a response from CPS confirms it, and can't undo a final status CPS returned.
+
+    Notifications update the index through ``apply``, or by passing the index to a
+    ``NotificationReceiver``. A notification that never arrives only leaves an entry stale, and
+    ``reconcile`` lists the transfers still pending to catch up on those:
+
+        index = api.TransferIndex(ttl=60)
+        client = api.Client(host, key, cache=index)
+        receiver = NotificationReceiver(index=index)
+        index.reconcile_every(client, 300)
+
+    Entries live in memory, at most maxsize of them. With a path they are also written to a
+    SQLite database there, which outlives the process and answers for entries evicted from
+    memory. Entries are updated in wall-clock time so their freshness survives a restart.
+    """
+
+    def __init__(self, ttl=30.0, maxsize=100000, path=None, cache=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.reconciled = 0
+        self.last_error = None
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.db = None
+        if path is not None:
+            import sqlite3
+            # notifications and client calls update the index from different threads
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(transfer_index)")]
+            if "confirmed" not in columns:
+                # an index written before entries were confirmed; none of them is trusted for good
+                with self.db:
+                    self.db.execute("ALTER TABLE transfer_index ADD COLUMN confirmed INTEGER DEFAULT 0")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+    def __len__(self):
+        with self._lock:
+            if self.db is not None:
+                return self.db.execute("SELECT COUNT(*) FROM transfer_index").fetchone()[0]
+            return len(self._entries)
+
+    """ entries """
+
+    def _remember(self, id, entry):
+        self._entries[id] = entry
+        self._entries.move_to_end(id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load(self, id):
+        row = self.db.execute("SELECT json, etag, updated, confirmed FROM transfer_index WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            return None
+        entry = IndexEntry(codec.loads(row[0]), row[1], row[2], self.ttl, bool(row[3]))
+        self._remember(id, entry)
+        return entry
+
+    def _save(self, id, entry):
+        json_ = codec.dumps(entry.json["data"])
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO transfer_index (id, status, createDate, json, etag, updated, confirmed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (id, entry.status, entry.createDate, json_.decode() if isinstance(json_, bytes) else json_, entry.etag, entry.updated, int(entry.confirmed)))
+
+    def entry(self, id):
+        """The entry for transfer id, fresh or stale, or None."""
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is not None:
+                self._entries.move_to_end(id)
+            elif self.db is not None:
+                entry = self._load(id)
+            return entry
+
+    def transfer(self, id):
+        """The indexed Transfer with id if its entry is fresh, else None."""
+        entry = self.entry(id)
+        if entry is None or not entry.fresh():
+            return None
+        return Transfer.from_json(entry.json["data"])
+
+    def update(self, json_, etag=None, confirmed=True):
+        """Records a transfer's JSON, from CPS unless confirmed is False, and returns whether its
+        status changed. An unconfirmed update of a settled transfer, or moving one out of a final
+        status, is out of date, e.g. a notification delivered late, and is ignored."""
+        id = json_["id"]
+        with self._lock:
+            previous = self.entry(id)
+            if (not confirmed and previous is not None and previous.final()
+                    and (previous.confirmed or json_.get("status") not in Transfer.FINAL_STATUSES)):
+                return False
+            entry = IndexEntry(json_, etag, time.time(), self.ttl, confirmed)
+            self._remember(id, entry)
+            if self.db is not None:
+                self._save(id, entry)
+            self.updates += 1
+            return previous is None or previous.status != entry.status
+
+    def apply(self, notification):
+        """Updates the index from a ``Notification``; returns whether a transfer's status changed."""
+        if notification.transfer is None:
+            return False
+        return self.update(notification.json["transfer"], confirmed=False)
+
+    def pending_statuses(self):
+        """Maps the id of every indexed transfer that isn't settled, i.e. without a final status
+        confirmed by CPS, to its status."""
+        with self._lock:
+            statuses = {}
+            if self.db is not None:
+                statuses.update(self.db.execute(_UNSETTLED.format("id, status"), Transfer.FINAL_STATUSES))
+            statuses.update((id, e.status) for id, e in self._entries.items() if not e.settled())
+            return statuses
+
+    def pending_since(self):
+        """The oldest createDate of the indexed transfers that aren't settled, or None."""
+        with self._lock:
+            dates = [e.createDate for e in self._entries.values() if not e.settled() and e.createDate is not None]
+            if self.db is not None:
+                row = self.db.execute(_UNSETTLED.format("MIN(createDate)"), Transfer.FINAL_STATUSES).fetchone()
+                if row[0] is not None:
+                    dates.append(row[0])
+            return min(dates) if dates else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.db is not None:
+                with self.db:
+                    self.db.execute("DELETE FROM transfer_index")
+
+    """ reconciliation """
+
+    def reconcile(self, client, since=None, pageSize=50):
+        """Lists the transfers created since since, by default the oldest pending one in the index,
+        and records them. Returns those whose status the index had missed, i.e. whose notification
+        was dropped or is still on its way, or took from a notification CPS disagrees with."""
+        if since is None:
+            since = self.pending_since()
+            if since is None:
+                return []
+
+        before = self.pending_statuses()
+        missed = []
+        for t in client.iter_transfers(PaginationParams(pageSize=pageSize), DateTimeParams(from_=since)):
+            if getattr(client, "cache", None) is not self:
+                self.update(transfer_json(t))
+            if t.id in before and t.status != before[t.id]:
+                missed.append(t)
+        self.reconciled += 1
+        return missed
+
+    def reconcile_every(self, client, interval=300.0, pageSize=50):
+        """Runs ``reconcile`` every interval seconds on a daemon thread until the returned
+        ``threading.Event`` is set. A failed sweep is kept in last_error and tried again next time."""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.reconcile(client, pageSize=pageSize)
+                    self.last_error = None
+                except (HttpException, OSError) as e:
+                    self.last_error = e
+
+        threading.Thread(target=run, name="cps-reconcile", daemon=True).start()
+        return stop
+
+    """ client cache interface """
+
+    def get(self, call):
+        if call.name != "get_transfer":
+            return None if self.cache is None else self.cache.get(call)
+
+        entry = self.entry(call.resource.rsplit("/", 1)[1])
+        with self._lock:
+            if entry is not None and entry.fresh():
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def put(self, call, json_, etag=None):
+        if call.name == "get_transfer" or call.name == "create_transfer":
+            self.update(json_["data"], etag if call.name == "get_transfer" else None)
+        elif call.name == "get_transfers":
+            for t in json_["data"]:
+                self.update(t)
+        if self.cache is not None:
+            self.cache.put(call, json_, etag)
+
+    def revalidated(self, call, entry):
+        if call.name != "get_transfer":
+            self.cache.revalidated(call, entry)
+            return
+        self.update(entry.json["data"], entry.etag, entry.confirmed)
+
+    def written(self, call):
+        if self.cache is not None:
+            self.cache.written(call)
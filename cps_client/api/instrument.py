@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+
+
+class RequestEvent:
+    """One client call that went to the network, as seen by an ``Instrument``. Calls coalesced
+    into another one's request don't get one.
+
+    Timings are in seconds. network runs from the start of the call until the response body is
+    read, so it includes rate-limit waits and retries; decode is parsing the body's JSON and
+    build making models out of it. A phase that didn't happen is None. status_code is None when
+    no response came back, and state is free for the instrument to use, e.g. to hold a span.
+    """
+
+    __slots__ = ("name", "method", "template", "resource", "status_code", "bytes", "retries",
+            "network", "decode", "build", "total", "error", "state", "_start", "_mark")
+
+    def __init__(self, name, method, template, resource):
+        self.name = name
+        self.method = method
+        self.template = template
+        self.resource = resource
+        self.status_code = None
+        self.bytes = 0
+        self.retries = 0
+        self.network = None
+        self.decode = None
+        self.build = None
+        self.total = None
+        self.error = None
+        self.state = None
+        self._start = self._mark = time.perf_counter()
+
+    def _lap(self):
+        now = time.perf_counter()
+        elapsed = now - self._mark
+        self._mark = now
+        return elapsed
+
+    def responded(self, status_code, size):
+        self.network = self._lap()
+        self.status_code = status_code
+        self.bytes = size
+
+    def decoded(self):
+        self.decode = self._lap()
+
+    def built(self):
+        self.build = self._lap()
+
+    def finish(self, error=None):
+        if self.network is None:
+            # the request failed before a response came back
+            self.network = self._lap()
+        self.total = time.perf_counter() - self._start
+        self.error = error
+        if self.status_code is None and error is not None:
+            self.status_code = getattr(error, "status_code", None)
+
+class Instrument:
+    """Receives a ``RequestEvent`` when a client call starts and again when it ends. Subclass it
+    and pass an instance to a client as ``instrument``. Hooks run on the calling thread, or the
+    event loop, so they should be quick."""
+
+    def request_start(self, event):
+        pass
+
+    def request_end(self, event):
+        pass
+
+class Histogram:
+    """HDR-style histogram: values land in logarithmic buckets, so every percentile is exact to
+    within precision (relative) and memory grows with the range of values, not their count."""
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        index = math.floor(math.log(max(value, 1e-9)) / self._log_base)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, p):
+        """The value below which p percent of the recorded values fall, or None if empty."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # the middle of the bucket, in log space
+                value = math.exp((index + 0.5) * self._log_base)
+                return min(self.max, max(self.min, value))
+
+class MetricsCollector(Instrument):
+    """Collects a latency histogram per endpoint and phase, plus request, byte and retry counts.
+
+    Endpoints are (method, template) pairs like ("GET", "/v1/transfers/{id}"); phases are
+    total, network, decode and build.
+    """
+
+    PHASES = ("total", "network", "decode", "build")
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        # (method, template, phase) -> Histogram
+        self.histograms = {}
+        # (method, template, status code, or the exception's name without one) -> count
+        self.requests = {}
+        self.bytes = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def request_end(self, event):
+        status = event.status_code
+        if status is None and event.error is not None:
+            status = type(event.error).__name__
+
+        with self._lock:
+            for phase in MetricsCollector.PHASES:
+                value = getattr(event, phase)
+                if value is not None:
+                    self.histogram(event.method, event.template, phase).record(value)
+            key = (event.method, event.template, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes += event.bytes
+            self.retries += event.retries
+
+    def histogram(self, method, template, phase="total"):
+        key = (method, template, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.precision)
+        return histogram
+
+    def snapshot(self):
+        """The collected metrics as plain data, with timings in milliseconds."""
+        with self._lock:
+            endpoints = {}
+            for (method, template, phase), h in sorted(self.histograms.items()):
+                endpoint = endpoints.setdefault("{} {}".format(method, template), {})
+                endpoint[phase] = {
+                    "count": h.count,
+                    "mean": h.mean() * 1000,
+                    "p50": h.percentile(50) * 1000,
+                    "p90": h.percentile(90) * 1000,
+                    "p99": h.percentile(99) * 1000,
+                    "max": h.max * 1000,
+                }
+            return {
+                "endpoints": endpoints,
+                "requests": [{ "method": m, "template": t, "status": s, "count": n }
+                        for (m, t, s), n in sorted(self.requests.items(), key=str)],
+                "bytes": self.bytes,
+                "retries": self.retries,
+            }
+
+    def report(self):
+        """A table of every endpoint's p50 and p99 total time and the p50 of each phase, in ms."""
+        lines = ["{:<48} {:>7} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                "endpoint", "count", "p50", "p99", "network", "decode", "build")]
+        for endpoint, phases in self.snapshot()["endpoints"].items():
+            total = phases["total"]
+            lines.append("{:<48} {:>7} {:>9.2f} {:>9.2f} {:>9} {:>9} {:>9}".format(
+                    endpoint, total["count"], total["p50"], total["p99"],
+                    *("{:.2f}".format(phases[p]["p50"]) if p in phases else "-" for p in ("network", "decode", "build"))))
+        return "\n".join(lines)
+
+class TracingInstrument(Instrument):
+    """Reports each call as a client span from an OpenTelemetry tracer, or anything with the same
+    ``start_span``/``set_attribute``/``record_exception``/``end`` interface:
+
+        from opentelemetry import trace
+        client = api.Client(host, key, instrument=api.TracingInstrument(trace.get_tracer("cps_client")))
+
+    Phase timings are recorded as attributes of the span, in milliseconds.
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        try:
+            from opentelemetry.trace import SpanKind, Status, StatusCode
+            self.kind = SpanKind.CLIENT
+            self.error_status = lambda e: Status(StatusCode.ERROR, repr(e))
+        except ImportError:
+            self.kind = None
+            self.error_status = None
+
+    def request_start(self, event):
+        attributes = {
+            "http.method": event.method,
+            "http.url": event.resource,
+            "cps.operation": event.name,
+            "cps.template": event.template,
+        }
+        name = "CPS {} {}".format(event.method, event.template)
+        if self.kind is None:
+            event.state = self.tracer.start_span(name, attributes=attributes)
+        else:
+            event.state = self.tracer.start_span(name, kind=self.kind, attributes=attributes)
+
+    def request_end(self, event):
+        span = event.state
+        if event.status_code is not None:
+            span.set_attribute("http.status_code", event.status_code)
+        span.set_attribute("http.response_content_length", event.bytes)
+        span.set_attribute("cps.retries", event.retries)
+        for phase in ("network", "decode", "build"):
+            value = getattr(event, phase)
+            if value is not None:
+                span.set_attribute("cps.{}_ms".format(phase), value * 1000)
+        if event.error is not None:
+            span.record_exception(event.error)
+            if self.error_status is not None:
+                span.set_status(self.error_status(event.error))
+        span.end()
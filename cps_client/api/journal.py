@@ -0,0 +1,184 @@
+import os
+import threading
+
+from . import codec
+from .model import json_default
+
+
+class JournaledRequest:
+    """A journaled request body, resent as-is. Exposes idempotencyKey like the request objects
+    so RetryPolicy still treats it as safe to retry."""
+
+    def __init__(self, json_):
+        self.__dict__.update(json_)
+
+class IdempotencyJournal:
+    """Write-ahead log of create requests, keyed by idempotency key, in a JSON Lines file.
+
+    A client given a journal records each create's key, resource and body before sending it and
+    the response once it arrives. A create whose key already has a response is answered from the
+    journal without a request, so a batch that crashed can be run again with the same keys at full
+    speed. Creates that were sent but never answered are listed by ``pending`` and resent, with
+    their original keys, by the client's ``resume_journal``. Creates rejected with a 4xx aren't
+    pending, but aren't answered from the journal either, so calling again retries them.
+
+    A request record is on disk before its request is sent. Concurrent writers share fsyncs: one
+    fsync covers every record written while the previous one was running. Responses are only
+    flushed, as losing one just costs a resend with the same key. ``syncs`` counts the fsyncs.
+
+    The file only grows, and is read whole when the journal is opened. ``compact`` rewrites it
+    with just the pending creates, e.g. once a batch has finished.
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.syncs = 0
+        # key -> request record, key -> response JSON and key -> status code of a 4xx
+        self._requests = {}
+        self._responses = {}
+        self._rejected = {}
+        torn = self._load()
+
+        self._f = open(path, "a", encoding="utf-8")
+        if torn:
+            # end a line cut short by a crash so the next record starts on its own
+            self._f.write("\n")
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._written = 0
+        self._durable = 0
+        self._syncing = False
+
+    def _load(self):
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return False
+
+        line = ""
+        with f:
+            for line in f:
+                try:
+                    record = codec.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict) or "key" not in record:
+                    continue
+                if "request" in record:
+                    self._requests[record["key"]] = record["request"]
+                elif "response" in record:
+                    self._responses[record["key"]] = record["response"]
+                elif "rejected" in record:
+                    self._rejected[record["key"]] = record["rejected"]
+        return line != "" and not line.endswith("\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.sync()
+        self._f.close()
+
+    def __len__(self):
+        return len(self._requests)
+
+    def lookup(self, key):
+        """The response JSON recorded for key, or None."""
+        return self._responses.get(key)
+
+    def pending(self):
+        """(key, request record) of every create sent without a recorded response."""
+        return [(key, req) for key, req in self._requests.items()
+                if key not in self._responses and key not in self._rejected]
+
+    def begin(self, key, call):
+        """Records a create and returns once the record is on disk."""
+        if key in self._requests:
+            return
+        # the body as it's written, so resume_journal resends the same whether or not the journal
+        # was reopened since
+        body = codec.loads(codec.dumps(call.body, default=json_default))
+        request = { "name": call.name, "resource": call.resource, "body": body }
+        self._requests[key] = request
+        self._write({ "key": key, "request": request }, durable=True)
+
+    def complete(self, key, json_):
+        self._rejected.pop(key, None)
+        self._responses[key] = json_
+        self._write({ "key": key, "response": json_ }, durable=False)
+
+    def reject(self, key, status_code):
+        self._rejected[key] = status_code
+        self._write({ "key": key, "rejected": status_code }, durable=False)
+
+    def _write(self, record, durable):
+        line = codec.dumps(record, default=json_default)
+        line = (line.decode() if isinstance(line, bytes) else line) + "\n"
+
+        with self._lock:
+            self._f.write(line)
+            self._written += 1
+            if not durable:
+                return
+            seq = self._written
+            while self._durable < seq:
+                if self._syncing:
+                    # someone else's fsync is running; the next one may cover this record too
+                    self._synced.wait()
+                    continue
+                self._sync_locked()
+
+    def _sync_locked(self):
+        self._syncing = True
+        target = self._written
+        self._f.flush()
+        self._lock.release()
+        try:
+            if self.fsync:
+                os.fsync(self._f.fileno())
+            self.syncs += 1
+        finally:
+            self._lock.acquire()
+            self._syncing = False
+            self._durable = max(self._durable, target)
+            self._synced.notify_all()
+
+    def compact(self):
+        """Rewrites the file with only the pending creates' records, dropping answered and
+        rejected ones, which are then sent again if called again with the same key. Returns how
+        many records were kept."""
+        with self._lock:
+            while self._syncing:
+                self._synced.wait()
+            self._f.close()
+
+            pending = [(key, req) for key, req in self._requests.items()
+                    if key not in self._responses and key not in self._rejected]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for key, request in pending:
+                    line = codec.dumps({ "key": key, "request": request }, default=json_default)
+                    f.write((line.decode() if isinstance(line, bytes) else line) + "\n")
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+            self._requests = dict(pending)
+            self._responses = {}
+            self._rejected = {}
+            self._f = open(self.path, "a", encoding="utf-8")
+            self._durable = self._written
+            return len(pending)
+
+    def sync(self):
+        """Makes every record written so far durable."""
+        with self._lock:
+            while self._syncing:
+                self._synced.wait()
+            if self._durable < self._written:
+                self._sync_locked()
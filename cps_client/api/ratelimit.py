@@ -0,0 +1,110 @@
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class TokenBucket:
+    """In-process token bucket refilled at rate tokens per second, holding at most burst.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def reserve(self, tokens=1):
+        """Takes tokens and returns how many seconds the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+class FileTokenBucket:
+    """Token bucket whose state lives in a small file, shared by every process on a host.
+
+    The level and last refill time are stored as two doubles and updated under an exclusive
+    flock, so all processes using the same path draw from one budget. Time comes from the
+    wall clock, since monotonic clocks aren't comparable between processes.
+    """
+
+    _state = struct.Struct("dd")
+
+    def __init__(self, path, rate, burst=None):
+        if fcntl is None:
+            raise RuntimeError("FileTokenBucket needs fcntl, which isn't available on this platform")
+
+        self.path = path
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Takes tokens and returns how many seconds the caller must wait before using them."""
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()
+
+                raw = os.pread(fd, self._state.size, 0)
+                if len(raw) == self._state.size:
+                    level, updated = self._state.unpack(raw)
+                    level = min(self.burst, level + max(0.0, now - updated) * self.rate)
+                else:
+                    level = self.burst
+
+                level -= tokens
+                os.pwrite(fd, self._state.pack(level, now), 0)
+            finally:
+                os.close(fd)
+
+        if level >= 0:
+            return 0.0
+        return -level / self.rate
+
+class RateLimiter:
+    """Maps calls to a token bucket per endpoint class.
+
+    CPS budgets transfer creation separately from everything else, so calls are classed as
+    "transfers" (creating a transfer), "writes" (any other POST or DELETE) or "reads". A class
+    without a bucket isn't limited; "writes" falls back to the "reads" bucket when it has none.
+
+        limiter = RateLimiter(reads=TokenBucket(20), transfers=FileTokenBucket("/tmp/cps-transfers", 5))
+        client = api.Client(host, key, rate_limiter=limiter)
+    """
+
+    def __init__(self, reads=None, writes=None, transfers=None):
+        self.buckets = {
+            "reads": reads,
+            "writes": writes if writes is not None else reads,
+            "transfers": transfers,
+        }
+
+    @staticmethod
+    def classify(method, resource):
+        if method == "GET":
+            return "reads"
+        if method == "POST" and resource.endswith("/transfers"):
+            return "transfers"
+        return "writes"
+
+    def reserve(self, method, resource):
+        """Returns how many seconds to wait before sending the request."""
+        bucket = self.buckets[self.classify(method, resource)]
+        if bucket is None:
+            return 0.0
+        return bucket.reserve()
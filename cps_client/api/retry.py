@@ -0,0 +1,54 @@
+import random
+
+
+class RetryPolicy:
+    """Retries idempotent calls that fail with a 5xx, a 429 or a connection error.
+
+    Delays use exponential backoff with full jitter, min(backoff_cap, backoff_base * 2 ** attempt)
+    scaled by a random factor, so clients that failed together don't retry in lockstep. A
+    Retry-After sent by the server is honored as the minimum delay. GETs and DELETEs are always
+    idempotent; POSTs only when their body carries an idempotencyKey.
+
+    on_retry, if given, is called as on_retry(method, resource, attempt, delay, error) before
+    each retry is slept on.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.5, backoff_cap=30.0, on_retry=None):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.on_retry = on_retry
+
+    @staticmethod
+    def is_idempotent(call):
+        if call.method in ("GET", "DELETE"):
+            return True
+        return getattr(call.body, "idempotencyKey", None) is not None
+
+    @staticmethod
+    def is_retryable(error):
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            # not an HttpException: the request never got a response
+            return True
+        return status_code == 429 or status_code >= 500
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def delay(self, call, error, attempt):
+        """Returns how long to wait before retrying call after attempt failed with error, or None
+        to give up. attempt counts from 0."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if not self.is_idempotent(call) or not self.is_retryable(error):
+            return None
+
+        delay = self.backoff(attempt)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        if self.on_retry is not None:
+            self.on_retry(call.method, call.resource, attempt + 1, delay, error)
+        return delay
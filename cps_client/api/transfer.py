@@ -1,7 +1,9 @@
-import json
+from .model import Model, lazy_field
 
 
-class Location:
+class Location(Model):
+    __slots__ = ("type",)
+
     def __init__(self, type):
         self.type = type
 
@@ -13,6 +15,8 @@ class Location:
             return WalletLocation.from_json(json_)
 
 class WalletLocation(Location):
+    __slots__ = ("id", "address")
+
     def __init__(self, id, address=None):
         Location.__init__(self, "wallet")
         self.id = id
@@ -26,6 +30,8 @@ class WalletLocation(Location):
         return WalletLocation(json_["id"], address)
 
 class BlockchainLocation(Location):
+    __slots__ = ("address", "chain")
+
     def __init__(self, address, chain):
         Location.__init__(self, "blockchain")
         self.address = address
@@ -38,7 +44,9 @@ class BlockchainLocation(Location):
             address = json_["address"]
         return BlockchainLocation(address, json_["chain"])
 
-class Money:
+class Money(Model):
+    __slots__ = ("amount", "currency")
+
     def __init__(self, amount, currency):
         self.amount = amount
         self.currency = currency
@@ -47,14 +55,20 @@ class Money:
     def from_json(json_):
         return Money(json_["amount"], json_["currency"])
 
-class Transfer:
-    def __init__(self, id, source, destination, amount, status, transactionHash):
+class Transfer(Model):
+    __slots__ = ("id", "source", "destination", "amount", "status", "transactionHash", "createDate")
+
+    # statuses a transfer never leaves
+    FINAL_STATUSES = ("complete", "failed")
+
+    def __init__(self, id, source, destination, amount, status, transactionHash, createDate=None):
         self.id = id
         self.source = source
         self.destination = destination
         self.amount = amount
         self.status = status
         self.transactionHash = transactionHash
+        self.createDate = createDate
 
     @staticmethod
     def from_json(json_):
@@ -64,13 +78,32 @@ class Transfer:
                 Location.from_json(json_["destination"]),
                 Money.from_json(json_["amount"]),
                 json_["status"],
-                json_.get("transactionHash"))
+                json_.get("transactionHash"),
+                json_.get("createDate"))
 
     def page_after(self):
         return self.id
 
-    def __str__(self):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+    def is_final(self):
+        return self.status in Transfer.FINAL_STATUSES
 
-    def __repr__(self):
-        return self.__str__()
+class LazyTransfer(Transfer):
+    """A Transfer that wraps its JSON and only builds fields, including the nested Location and
+    Money objects, the first time they're read. Used by clients created with lazy=True."""
+
+    __slots__ = ("_json",)
+
+    def __init__(self, json_):
+        self._json = json_
+
+    id = lazy_field(Transfer, "id")
+    source = lazy_field(Transfer, "source", Location.from_json)
+    destination = lazy_field(Transfer, "destination", Location.from_json)
+    amount = lazy_field(Transfer, "amount", Money.from_json)
+    status = lazy_field(Transfer, "status")
+    transactionHash = lazy_field(Transfer, "transactionHash")
+    createDate = lazy_field(Transfer, "createDate")
+
+    @staticmethod
+    def from_json(json_):
+        return LazyTransfer(json_)
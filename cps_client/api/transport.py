@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from . import codec
+
+
+class Headers(dict):
+    """Response headers looked up case-insensitively, like requests' headers."""
+
+    def __init__(self, headers=()):
+        dict.__init__(self, ((k.lower(), v) for k, v in dict(headers).items()))
+
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name.lower())
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name.lower())
+
+    def get(self, name, default=None):
+        return dict.get(self, name.lower(), default)
+
+class Response:
+    """A response read back from a cassette, with the parts of a requests.Response the client
+    reads: status_code, headers and content."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = Headers(headers)
+        self.content = content
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded response left for a request."""
+
+def _request_key(method, url, params, data, match_body):
+    """What a recorded request is matched on. The host is left out so a cassette recorded against
+    the sandbox replays under any host, and params that are None are dropped as requests does."""
+    params = tuple(sorted((k, str(v)) for k, v in (params or {}).items() if v is not None))
+    return (method, urlsplit(url).path, params, data if match_body else None)
+
+def _text(data):
+    return data.decode("utf-8") if isinstance(data, bytes) else data
+
+class RequestsTransport:
+    """Sends requests over a pooled, keep-alive requests.Session. This is what a Client uses
+    unless it is given a transport.
+
+    pool_connections is the number of per-host pools to keep and pool_maxsize the number of
+    connections kept alive in each of them. With pool_block, pool_maxsize is also a cap: a request
+    waits for a connection to come back to the pool rather than opening one more that's thrown
+    away afterwards. keepalive_timeout, in seconds, drops idle
+    connections before the server (or a load balancer) silently closes them underneath us.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, keepalive_timeout=None, pool_block=False):
+        # requests is imported here, not with the package, so that importing cps_client for the
+        # CLI's help or for AsyncClient doesn't pay for it
+        import requests
+        import requests.adapters
+
+        # exceptions that mean the request didn't get an answer and may be retried
+        self.errors = (requests.RequestException,)
+        self.keepalive_timeout = keepalive_timeout
+        self._last_used = None
+        self._adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block)
+        self.session = requests.Session()
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def send(self, method, url, params=None, data=None, headers=None):
+        now = time.monotonic()
+        if (self.keepalive_timeout is not None and self._last_used is not None
+                and now - self._last_used > self.keepalive_timeout):
+            self._adapter.poolmanager.clear()
+        self._last_used = now
+
+        return self.session.request(method, url, data=data, headers=headers, params=params)
+
+    def close(self):
+        self.session.close()
+
+class RecordingTransport:
+    """Sends requests through transport, a ``RequestsTransport`` by default, and appends each
+    request and its response to a cassette: a JSON Lines file at path that ``ReplayTransport``
+    plays back. Request headers, and so the API key, aren't recorded."""
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.errors = self.transport.errors
+        self.recorded = 0
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def send(self, method, url, params=None, data=None, headers=None):
+        res = self.transport.send(method, url, params=params, data=data, headers=headers)
+        line = codec.dumps({
+            "request": {
+                "method": method,
+                "url": url,
+                "params": { k: str(v) for k, v in (params or {}).items() if v is not None },
+                "body": _text(data),
+            },
+            "response": {
+                "status": res.status_code,
+                "headers": dict(res.headers),
+                "body": _text(res.content),
+            },
+        })
+        with self._lock:
+            self._f.write(_text(line) + "\n")
+            self._f.flush()
+            self.recorded += 1
+        return res
+
+    def close(self):
+        self._f.close()
+        self.transport.close()
+
+class ReplayTransport:
+    """Answers requests from a cassette written by ``RecordingTransport``, without a network.
+
+    Requests are matched on method, path and query params, and on their body too with
+    match_body. Bodies are left out by default as creates carry a fresh idempotency key every
+    time. Identical requests get their recorded responses in order; once those run out a
+    request raises ``CassetteMiss``, unless loop is set, in which case they start over, e.g. to
+    replay a short recording for as long as a benchmark runs.
+    """
+
+    def __init__(self, path, match_body=False, loop=False):
+        self.path = path
+        self.match_body = match_body
+        self.loop = loop
+        self.errors = ()
+        self.replayed = 0
+        # request key -> recorded responses not yet replayed, and every recorded response
+        self._pending = {}
+        self._recorded = {}
+        self._lock = threading.Lock()
+
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = codec.loads(line)
+                req, res = record["request"], record["response"]
+                key = _request_key(req["method"], req["url"], req["params"], req["body"], match_body)
+                body = res["body"]
+                response = (res["status"], res["headers"], body.encode("utf-8") if body is not None else b"")
+                self._recorded.setdefault(key, []).append(response)
+        for key, responses in self._recorded.items():
+            self._pending[key] = deque(responses)
+
+    def send(self, method, url, params=None, data=None, headers=None):
+        key = _request_key(method, url, params, _text(data), self.match_body)
+        with self._lock:
+            pending = self._pending.get(key)
+            if not pending and self.loop and key in self._recorded:
+                pending = self._pending[key] = deque(self._recorded[key])
+            if not pending:
+                raise CassetteMiss("no recorded response for {} {}".format(method, url))
+            status, headers, content = pending.popleft()
+            self.replayed += 1
+        return Response(status, headers, content)
+
+    def close(self):
+        pass
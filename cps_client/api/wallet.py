@@ -1,10 +1,10 @@
-import json
-import uuid
-
+from .model import Model, lazy_field, idempotency_key
 from .transfer import Money
 
 
-class Wallet:
+class Wallet(Model):
+    __slots__ = ("walletId", "balances")
+
     def __init__(self, walletId, balances):
         self.walletId = walletId
         self.balances = balances
@@ -20,17 +20,28 @@ class Wallet:
     def page_after(self):
         return self.walletId
 
-    def __str__(self):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
+class LazyWallet(Wallet):
+    """A Wallet that only builds its balances the first time they're read."""
+
+    __slots__ = ("_json",)
+
+    def __init__(self, json_):
+        self._json = json_
+
+    walletId = lazy_field(Wallet, "walletId")
+    balances = lazy_field(Wallet, "balances", lambda balances: [Money.from_json(m) for m in balances])
 
-    def __repr__(self):
-        return self.__str__()
+    @staticmethod
+    def from_json(json_):
+        return LazyWallet(json_)
 
 class CreateWalletRequest:
-    def __init__(self):
-        self.idempotencyKey = str(uuid.uuid4())
+    def __init__(self, idempotencyKey=None):
+        self.idempotencyKey = idempotencyKey or idempotency_key()
+
+class Address(Model):
+    __slots__ = ("address", "currency", "chain")
 
-class Address:
     def __init__(self, address, currency, chain):
         self.address = address
         self.currency = currency
@@ -43,14 +54,8 @@ class Address:
     def from_json(json_):
         return Address(json_["address"], json_["currency"], json_["chain"])
 
-    def __str__(self):
-        return json.dumps(self, default=lambda o: o.__dict__, indent=4)
-
-    def __repr__(self):
-        return self.__str__()
-
 class CreateAddressRequest:
-    def __init__(self, currency, chain):
-        self.idempotencyKey = str(uuid.uuid4())
+    def __init__(self, currency, chain, idempotencyKey=None):
+        self.idempotencyKey = idempotencyKey or idempotency_key()
         self.currency = currency
         self.chain = chain
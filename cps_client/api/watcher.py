@@ -0,0 +1,252 @@
+import time
+
+from .api import ClientException, DateTimeParams, PaginationParams
+from .backfill import parse_datetime
+from .index import TransferIndex
+from .transfer import Transfer
+
+
+class _Watch:
+    """Bookkeeping shared by the sync and async watchers: which transfers are pending, how to
+    refresh them this round and how long to wait before the next one."""
+
+    def __init__(self, client, index, min_interval, max_interval, pageSize, max_pages, list_threshold):
+        if index is None and isinstance(getattr(client, "cache", None), TransferIndex):
+            index = client.cache
+        self.client = client
+        self.index = index
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.pageSize = pageSize
+        self.max_pages = max_pages
+        self.list_threshold = list_threshold
+        self.interval = min_interval
+        # transfer id -> createDate, or None when it isn't known
+        self.pending = {}
+        self.statuses = {}
+        self.changed = False
+
+    def watch(self, transfer):
+        """Starts watching a Transfer, or a transfer id. Passing the Transfer returned by
+        create_transfer lets it be refreshed through list queries."""
+        if isinstance(transfer, Transfer):
+            if transfer.is_final():
+                return
+            self.pending[transfer.id] = transfer.createDate
+            self.statuses[transfer.id] = transfer.status
+        else:
+            self.pending.setdefault(transfer, None)
+
+    def unwatch(self, id):
+        self.pending.pop(id, None)
+        self.statuses.pop(id, None)
+
+    def indexed(self):
+        """The pending transfers with a fresh entry in the index, which needn't be fetched."""
+        if self.index is None:
+            return []
+        transfers = [self.index.transfer(id) for id in self.pending]
+        return [t for t in transfers if t is not None]
+
+    def window(self, skip=()):
+        """The DateTimeParams covering every pending transfer with a known createDate but those in
+        skip, or None when there are too few of them for a list query to beat per-id GETs."""
+        dated = [d for id, d in self.pending.items() if d is not None and id not in skip]
+        if len(dated) < self.list_threshold:
+            return None
+        return DateTimeParams(from_=min(dated))
+
+    def list_more(self, pages, transfers, unseen, newest, window):
+        """Whether to list another page of window after pages of them, transfers being the last
+        and newest the createDate the first page started at. Up to max_pages are listed while
+        anything is unseen. Past that, listing goes on while the pages left before the start of
+        the window, estimated from the time the pages so far covered, are fewer than the unseen
+        transfers they'd save fetching one by one."""
+        if not unseen or len(transfers) < self.pageSize:
+            return False
+        if self.max_pages is None or pages < self.max_pages:
+            return True
+
+        oldest = parse_datetime(transfers[-1].createDate)
+        covered = (parse_datetime(newest) - oldest).total_seconds()
+        if covered <= 0:
+            return True
+        left = (oldest - parse_datetime(window.params["from"])).total_seconds()
+        return len(unseen) > pages * left / covered
+
+    def update(self, transfers):
+        """Records refreshed transfers and returns those that reached a final status."""
+        final = []
+        for t in transfers:
+            if t.id not in self.pending:
+                continue
+            if self.on_refresh is not None:
+                self.on_refresh(t)
+            if self.pending[t.id] is None:
+                self.pending[t.id] = t.createDate
+            if t.status != self.statuses.get(t.id):
+                self.statuses[t.id] = t.status
+                self.changed = True
+            if t.is_final():
+                self.unwatch(t.id)
+                final.append(t)
+        return final
+
+    def begin(self):
+        self.changed = False
+
+    def end(self):
+        # poll quickly while transfers are moving, back off while nothing changes
+        if self.changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+
+class TransferWatcher(_Watch):
+    """Polls pending transfers until they reach a final status.
+
+    Each round lists transfers created since the oldest pending one, a page at a time, until
+    every pending transfer has been seen or the list ends. After max_pages pages it only goes
+    on while that looks cheaper than fetching the transfers still unseen one by one, e.g. not
+    for a handful of old transfers behind hundreds of pages of newer ones. Only transfers still
+    unseen, or whose createDate isn't known, are fetched one by one. Transfers with a fresh entry
+    in index, a ``TransferIndex`` that defaults to the client's cache if it is one, aren't
+    fetched at all, so a watcher fed by notifications only polls for what they missed. Rounds
+    are min_interval apart while statuses are changing and back off up to max_interval while
+    they aren't.
+
+    on_final(transfer) is called as each transfer finishes; iterating over the watcher yields
+    them instead, polling until nothing is left pending. on_refresh(transfer) is called with
+    every pending transfer a round refreshed, final or not.
+
+        watcher = TransferWatcher(client)
+        for source, destination, amount in payouts:
+            watcher.watch(client.create_transfer(source, destination, amount))
+        for transfer in watcher:
+            print(transfer.id, transfer.status)
+    """
+
+    def __init__(self, client, on_final=None, min_interval=1.0, max_interval=30.0, pageSize=50, max_pages=20, list_threshold=5, index=None, on_refresh=None):
+        _Watch.__init__(self, client, index, min_interval, max_interval, pageSize, max_pages, list_threshold)
+        self.on_final = on_final
+        self.on_refresh = on_refresh
+
+    def poll(self):
+        """Runs one polling round and returns the transfers that reached a final status."""
+        self.begin()
+        indexed = self.indexed()
+        final = self.update(indexed)
+        fresh = set(t.id for t in indexed)
+
+        window = self.window(fresh)
+        if window is not None:
+            unseen = set(self.pending) - fresh
+            paginationParams = PaginationParams(pageSize=self.pageSize)
+            pages, newest = 0, None
+            while True:
+                transfers = self.client.get_transfers(paginationParams, window)
+                pages += 1
+                unseen.difference_update(t.id for t in transfers)
+                final += self.update(transfers)
+                if newest is None and transfers:
+                    newest = transfers[0].createDate
+                if not self.list_more(pages, transfers, unseen, newest, window):
+                    break
+                paginationParams.set_page_after(transfers[-1].page_after())
+
+        for id in [id for id, createDate in self.pending.items()
+                if id not in fresh and (window is None or createDate is None or id in unseen)]:
+            try:
+                final += self.update([self.client.get_transfer(id)])
+            except ClientException as e:
+                if e.status_code != 404:
+                    raise
+                self.unwatch(id)
+
+        self.end()
+        if self.on_final is not None:
+            for t in final:
+                self.on_final(t)
+        return final
+
+    def run(self):
+        """Polls until no transfers are pending."""
+        for _ in self:
+            pass
+
+    def __iter__(self):
+        while self.pending:
+            yield from self.poll()
+            if self.pending:
+                time.sleep(self.interval)
+
+class AsyncTransferWatcher(_Watch):
+    """``TransferWatcher`` for an ``AsyncClient``, consumed with ``async for``."""
+
+    def __init__(self, client, on_final=None, min_interval=1.0, max_interval=30.0, pageSize=50, max_pages=20, list_threshold=5, concurrency=16, index=None, on_refresh=None):
+        _Watch.__init__(self, client, index, min_interval, max_interval, pageSize, max_pages, list_threshold)
+        self.on_final = on_final
+        self.on_refresh = on_refresh
+        self.concurrency = concurrency
+
+    async def _get(self, semaphore, id):
+        async with semaphore:
+            try:
+                return await self.client.get_transfer(id)
+            except ClientException as e:
+                if e.status_code != 404:
+                    raise
+                self.unwatch(id)
+                return None
+
+    async def poll(self):
+        """Runs one polling round and returns the transfers that reached a final status."""
+        # imported here so that TransferWatcher users don't load asyncio
+        import asyncio
+
+        self.begin()
+        indexed = self.indexed()
+        final = self.update(indexed)
+        fresh = set(t.id for t in indexed)
+
+        window = self.window(fresh)
+        if window is not None:
+            unseen = set(self.pending) - fresh
+            paginationParams = PaginationParams(pageSize=self.pageSize)
+            pages, newest = 0, None
+            while True:
+                transfers = await self.client.get_transfers(paginationParams, window)
+                pages += 1
+                unseen.difference_update(t.id for t in transfers)
+                final += self.update(transfers)
+                if newest is None and transfers:
+                    newest = transfers[0].createDate
+                if not self.list_more(pages, transfers, unseen, newest, window):
+                    break
+                paginationParams.set_page_after(transfers[-1].page_after())
+
+        ids = [id for id, createDate in self.pending.items()
+                if id not in fresh and (window is None or createDate is None or id in unseen)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        transfers = await asyncio.gather(*[self._get(semaphore, id) for id in ids])
+        final += self.update([t for t in transfers if t is not None])
+
+        self.end()
+        if self.on_final is not None:
+            for t in final:
+                self.on_final(t)
+        return final
+
+    async def run(self):
+        """Polls until no transfers are pending."""
+        async for _ in self:
+            pass
+
+    async def __aiter__(self):
+        import asyncio
+
+        while self.pending:
+            for t in await self.poll():
+                yield t
+            if self.pending:
+                await asyncio.sleep(self.interval)
@@ -0,0 +1,69 @@
+"""Totals wallet balances by currency across every wallet.
+
+Amounts are summed as Decimals, so totals are exact, and wallets are streamed a page at a time,
+so memory only grows with the number of currencies.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from . import api
+
+
+class BalanceSummary:
+    """Per-currency totals over a set of wallets."""
+
+    def __init__(self):
+        self.totals = {}
+        self.wallets = 0
+        self.funded = 0
+
+    def add(self, wallet):
+        self.wallets += 1
+        if wallet.balances:
+            self.funded += 1
+        for money in wallet.balances:
+            self.totals[money.currency] = self.totals.get(money.currency, Decimal(0)) + Decimal(money.amount)
+
+    def to_json(self):
+        return {
+            "wallets": self.wallets,
+            "funded": self.funded,
+            "totals": { currency: str(total) for currency, total in sorted(self.totals.items()) },
+        }
+
+    def __str__(self):
+        lines = ["{} wallets, {} with a balance".format(self.wallets, self.funded)]
+        for currency, total in sorted(self.totals.items()):
+            lines.append("{:<6} {}".format(currency, total))
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return self.__str__()
+
+def summarize_balances(client, *params, refresh=False, workers=8, pageSize=50):
+    """Streams every wallet matching params and returns a BalanceSummary.
+
+    Wallet list pages can lag behind balances; with refresh, each wallet is fetched again with
+    ``get_wallet``, workers at a time, before it's counted.
+    """
+    summary = BalanceSummary()
+    wallets = client.iter_wallets(api.PaginationParams(pageSize=pageSize), *params, prefetch=True)
+
+    if not refresh:
+        for wallet in wallets:
+            summary.add(wallet)
+        return summary
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map is eager, so feed it a page's worth at a time to keep memory bounded
+        batch = []
+        for wallet in wallets:
+            batch.append(wallet.walletId)
+            if len(batch) == pageSize:
+                for w in executor.map(client.get_wallet, batch):
+                    summary.add(w)
+                batch = []
+        for w in executor.map(client.get_wallet, batch):
+            summary.add(w)
+    return summary
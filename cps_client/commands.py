@@ -0,0 +1,380 @@
+import csv
+import itertools
+import json
+import os
+import sys
+
+import click
+
+from . import api
+from .api import codec
+from .api.model import json_default
+from . import balance
+from . import export
+from . import submit
+
+
+STREAM_FORMATS = ('jsonl', 'csv', 'table')
+
+WALLET_COLUMNS = ('walletId', 'balances')
+ADDRESS_COLUMNS = ('address', 'currency', 'chain')
+
+
+def wallet_row(wallet):
+    return (wallet.walletId, ' '.join('{} {}'.format(m.amount, m.currency) for m in wallet.balances))
+
+def address_row(address):
+    return (address.address, address.currency, address.chain)
+
+def stream_options(f):
+    """Options that switch a list command from interactive paging to streaming to stdout."""
+    f = click.option('--format', 'format_', type=click.Choice(STREAM_FORMATS), default=None, help='Stream results to stdout in this format (jsonl by default with --all or --limit).')(f)
+    f = click.option('--limit', default=None, type=int, help='Stream at most this many results to stdout.')(f)
+    f = click.option('--all', 'all_', is_flag=True, help='Stream every result to stdout instead of paging interactively.')(f)
+    return f
+
+def streaming(all_, limit, format_):
+    return all_ or limit is not None or format_ is not None
+
+def _jsonl(item):
+    line = codec.dumps(item, default=json_default)
+    return (line.decode() if isinstance(line, bytes) else line) + '\n'
+
+def stream(items, columns, row, format_=None, limit=None, chunk=50):
+    """Writes items to stdout chunk at a time, so output is written in large blocks while the
+    iterator prefetches the next page. Stops quietly if stdout is closed, e.g. by `| head`."""
+    format_ = format_ or 'jsonl'
+    if limit is not None:
+        items = itertools.islice(items, limit)
+
+    out = sys.stdout
+    try:
+        writer = csv.writer(out)
+        if format_ == 'csv':
+            writer.writerow(columns)
+
+        widths = None
+        while True:
+            batch = list(itertools.islice(items, chunk))
+            if not batch:
+                break
+
+            if format_ == 'jsonl':
+                out.write(''.join(_jsonl(item) for item in batch))
+            elif format_ == 'csv':
+                writer.writerows(row(item) for item in batch)
+            else:
+                rows = [['' if v is None else str(v) for v in row(item)] for item in batch]
+                if widths is None:
+                    # sized on the first page so rows can be written as they arrive
+                    widths = [max(len(c), *(len(r[i]) for r in rows)) for i, c in enumerate(columns)]
+                    out.write('  '.join(c.ljust(w) for c, w in zip(columns, widths)).rstrip() + '\n')
+                out.write(''.join('  '.join(v.ljust(w) for v, w in zip(r, widths)).rstrip() + '\n' for r in rows))
+        out.flush()
+    except BrokenPipeError:
+        # point stdout at devnull so the interpreter doesn't fail flushing it on exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, out.fileno())
+        sys.exit(0)
+
+@click.command()
+def wallet_create():
+    """Create a new wallet."""
+
+    with getClient() as c:
+        wallet = c.create_wallet()
+
+    print(wallet)
+
+@click.command()
+@click.argument('walletid')
+def wallet_get(walletid):
+    """Get a wallet.
+
+    WALLETID identifier of the wallet with which the created address will be associated.
+    """
+
+    with getClient() as c:
+        wallet = c.get_wallet(walletid)
+
+    print(wallet)
+
+@click.command()
+@click.option('--from', 'from_', default=None, help='Items created since the specified date-time (inclusive). Must be ISO-8691 formatted')
+@click.option('--to', default=None, help='Items created before the specified date-time (inclusive). Must be ISO-8601 formatted.')
+@click.option('--pageSize', default=50, help='The number of items to fetch per page.')
+@stream_options
+def wallets_get(from_, to, pagesize, all_, limit, format_):
+    """Get a collection of wallets."""
+
+    with getClient() as c:
+        paginationParams = api.PaginationParams(pageSize=pagesize)
+        datetimeParams = api.DateTimeParams(from_, to)
+
+        if streaming(all_, limit, format_):
+            wallets = c.iter_wallets(paginationParams, datetimeParams, prefetch=True)
+            stream(wallets, WALLET_COLUMNS, wallet_row, format_, limit, pagesize)
+            return
+
+        paginate(lambda paginateParams: c.get_wallets(paginateParams, datetimeParams), paginationParams)
+
+@click.command()
+@click.option('--from', 'from_', default=None, help='Items created since the specified date-time (inclusive). Must be ISO-8691 formatted')
+@click.option('--to', default=None, help='Items created before the specified date-time (inclusive). Must be ISO-8601 formatted.')
+@click.option('--refresh', is_flag=True, help='Fetch each wallet individually for its latest balances.')
+@click.option('--workers', default=8, help='The number of wallets refreshed concurrently with --refresh.')
+@click.option('--json', 'json_', is_flag=True, help='Print the summary as JSON.')
+def wallets_balance_summary(from_, to, refresh, workers, json_):
+    """Total balances by currency across all wallets."""
+
+    with getClient(pool_maxsize=workers) as c:
+        summary = balance.summarize_balances(c, api.DateTimeParams(from_, to), refresh=refresh, workers=workers)
+
+    if json_:
+        print(json.dumps(summary.to_json(), indent=4))
+    else:
+        print(summary)
+
+@click.command()
+@click.argument('walletid')
+@click.option('--currency', default='USD', help='the receivable currency of the generated address.')
+@click.option('--chain', default='ETH', help='the blockchain on which the address will be generated.')
+def wallet_address_create(walletid, currency, chain):
+    """Create a new wallet address.
+
+    WALLETID identifier of the wallet with which the created address will be associated.
+    """
+
+    with getClient() as c:
+        address = c.create_wallet_address(walletid, currency, chain)
+
+    print(address)
+
+@click.command()
+@click.argument('walletid')
+@click.option('--from', 'from_', default=None, help='Items created since the specified date-time (inclusive). Must be ISO-8691 formatted')
+@click.option('--to', default=None, help='Items created before the specified date-time (inclusive). Must be ISO-8601 formatted.')
+@click.option('--pageSize', default=50, help='The number of items to fetch per page.')
+@stream_options
+def wallet_addresses_get(walletid, from_, to, pagesize, all_, limit, format_):
+    """Get a collection of wallet addresses.
+
+    WALLETID identifier of the wallet to get associated addresses.
+    """
+
+    with getClient() as c:
+        paginationParams = api.PaginationParams(pageSize=pagesize)
+        datetimeParams = api.DateTimeParams(from_, to)
+
+        if streaming(all_, limit, format_):
+            addresses = c.iter_wallet_addresses(walletid, paginationParams, datetimeParams, prefetch=True)
+            stream(addresses, ADDRESS_COLUMNS, address_row, format_, limit, pagesize)
+            return
+
+        paginate(lambda paginateParams: c.get_wallet_addresses(walletid, paginateParams, datetimeParams), paginationParams)
+
+@click.command()
+@click.argument('walletid')
+@click.argument('address')
+@click.argument('amount')
+@click.option('--chain', default='ETH', help='The destination chain. Defaults to ETH.')
+@click.option('--currency', default='USD', help='The amount currency to transfer. Defaults to USD.')
+def transfer_create_blockchain(walletid, address, amount, currency, chain):
+    """Create transfers from a wallet to blockchain address.
+
+    WALLETID the source wallet id.\n
+    ADDRESS the blockchain destination address.\n
+    AMOUNT the value to send.
+    """
+
+    source = api.WalletLocation(walletid)
+    destination = api.BlockchainLocation(address, chain)
+    amount = api.Money(amount, currency)
+
+    with getClient() as c:
+        transfer = c.create_transfer(source, destination, amount)
+
+    print(transfer)
+
+@click.command()
+@click.argument('sourcewalletid')
+@click.argument('destwalletid')
+@click.argument('amount')
+@click.option('--currency', default='USD', help='the amount currency to transfer. Defaults to USD.')
+def transfer_create_wallet(sourcewalletid, destwalletid, amount, currency):
+    """Create transfers from a wallet to another wallet.
+
+    SOURCEWALLETID the source wallet id.\n
+    DESTWALLETID the destination wallet id.\n
+    AMOUNT the value to send.
+    """
+
+    source = api.WalletLocation(sourcewalletid)
+    destination = api.WalletLocation(destwalletid)
+    amount = api.Money(amount, currency)
+
+    with getClient() as c:
+        transfer = c.create_transfer(source, destination, amount)
+
+    print(transfer)
+
+@click.command()
+@click.argument('file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--results', '-o', default=None, help='The results file. Defaults to FILE with .results before its extension.')
+@click.option('--format', 'format_', type=click.Choice(submit.FORMATS), default=None, help='The format of FILE and the results file. Guessed from the extension by default.')
+@click.option('--concurrency', default=8, help='The number of transfers in flight at once.')
+@click.option('--rate', default=None, type=float, help='The most transfers to start per second.')
+def transfers_create_batch(file, results, format_, concurrency, rate):
+    """Create the transfers listed in a CSV or JSON Lines file.
+
+    FILE rows have sourceWalletId, destinationWalletId or destinationAddress and destinationChain,
+    amount, currency and optionally idempotencyKey. The results file repeats every row with its
+    transferId, status or error; pass it back as FILE to retry the rows that failed.
+    """
+
+    format_ = format_ or submit.guess_format(file)
+    if results is None:
+        root, ext = os.path.splitext(file)
+        results = root + '.results' + ext
+    if os.path.abspath(results) == os.path.abspath(file):
+        raise click.UsageError('the results file must not be FILE')
+
+    with open(file, newline='') as f:
+        rows = submit.read_rows(f, format_)
+
+    # the keys are on disk before anything is sent; if the outcomes below never make it, the
+    # results file still holds them for a rerun to resubmit the same rows with
+    submit.plan_rows(rows)
+    submit.save_rows(results, rows, format_)
+
+    partial = results + '.partial'
+    with getClient(pool_maxsize=concurrency) as c, open(partial, 'w', newline='') as out:
+        writer = submit.ResultWriter(out, format_)
+        with click.progressbar(length=len(rows), label='submitting', file=sys.stderr) as bar:
+            counts = submit.submit_rows(c, rows, writer, concurrency, rate, bar.update)
+    os.replace(partial, results)
+
+    click.echo('{created} created, {skipped} skipped, {failed} failed; results in '.format(**counts) + results, err=True)
+    if counts['failed']:
+        sys.exit(1)
+
+@click.command()
+@click.argument('id')
+def transfer_get(id):
+    """Get info about transfers.
+
+    ID the unique identifier of the transfer.
+    """
+    with getClient() as c:
+        transfer = c.get_transfer(id)
+
+    print(transfer)
+
+@click.command()
+@click.option('--sourceWalletId', default=None, help='The source wallet id of a transfer.')
+@click.option('--destinationWalletId', default=None, help='The destination wallet id of a transfer.')
+@click.option('--from', 'from_', default=None, help='Items created since the specified date-time (inclusive). Must be ISO-8691 formatted')
+@click.option('--to', default=None, help='Items created before the specified date-time (inclusive). Must be ISO-8601 formatted.')
+@click.option('--pageSize', default=50, help='The number of items to fetch per page.')
+@click.option('--backfill', is_flag=True, help='Fetch every transfer between --from and --to, paging time windows concurrently.')
+@click.option('--workers', default=4, help='The number of windows fetched concurrently with --backfill.')
+@stream_options
+def transfers_get(sourcewalletid, destinationwalletid, from_, to, pagesize, backfill, workers, all_, limit, format_):
+    """Get collection of transfers."""
+
+    transferParams = api.TransferParams(sourcewalletid, destinationwalletid)
+
+    if backfill:
+        if from_ is None or to is None:
+            raise click.UsageError('--backfill requires both --from and --to')
+
+        with getClient(pool_maxsize=workers) as c:
+            transfers = c.iter_transfers_backfill(from_, to, transferParams, workers=workers, pageSize=pagesize)
+            stream(transfers, export.COLUMNS, export.transfer_row, format_, limit, pagesize)
+        return
+
+    with getClient() as c:
+        paginationParams = api.PaginationParams(pageSize=pagesize)
+        datetimeParams = api.DateTimeParams(from_, to)
+
+        if streaming(all_, limit, format_):
+            transfers = c.iter_transfers(paginationParams, datetimeParams, transferParams, prefetch=True)
+            stream(transfers, export.COLUMNS, export.transfer_row, format_, limit, pagesize)
+            return
+
+        paginate(lambda paginateParams: c.get_transfers(paginateParams, datetimeParams, transferParams), paginationParams)
+
+@click.command()
+@click.option('--output', '-o', default=None, help='The file to write to. Defaults to stdout.')
+@click.option('--format', 'format_', type=click.Choice(export.FORMATS), default='csv', help='The output format. Defaults to csv.')
+@click.option('--sourceWalletId', default=None, help='The source wallet id of a transfer.')
+@click.option('--destinationWalletId', default=None, help='The destination wallet id of a transfer.')
+@click.option('--from', 'from_', default=None, help='Items created since the specified date-time (inclusive). Must be ISO-8691 formatted')
+@click.option('--to', default=None, help='Items created before the specified date-time (inclusive). Must be ISO-8601 formatted.')
+@click.option('--pageSize', default=50, help='The number of items to fetch per page.')
+def transfers_export(output, format_, sourcewalletid, destinationwalletid, from_, to, pagesize):
+    """Export all matching transfers as flat rows."""
+
+    with getClient() as c:
+        count = export.export_transfers(c, output, format_, from_, to, sourcewalletid, destinationwalletid, pagesize)
+
+    if output is not None:
+        print("exported {} transfers to {}".format(count, output))
+
+@click.command()
+def configuration_get():
+    """Get global CPS configuration."""
+
+    with getClient() as c:
+        config = c.get_configuration()
+
+    print(config)
+
+@click.command()
+@click.argument("endpoint")
+def subscription_create(endpoint):
+    """Create a subscription.
+
+    ENDPOINT the endpoint that will receive subscription notifications.
+    """
+
+    with getClient() as c:
+        subscription = c.create_subscription(endpoint)
+
+    print(subscription)
+
+@click.command()
+def subscriptions_get():
+    """Get a collection of subscriptions."""
+
+    with getClient() as c:
+        subscriptions = c.get_subscriptions()
+
+    print(subscriptions)
+
+@click.command()
+@click.argument("id")
+def subscription_delete(id):
+    """Delete a subscription.
+
+    ID of the subscription to be deleted.
+    """
+
+    with getClient() as c:
+        subscriptions = c.delete_subscription(id)
+
+    print("success")
+
+def getClient(**kwargs):
+    API_BASE_URL = os.environ.get('CPS_API_BASE_URL', 'https://api-sandbox.circle.com')
+    API_KEY = os.environ['CPS_API_KEY']
+    return api.Client(API_BASE_URL, API_KEY, **kwargs)
+
+def paginate(supplier, paginationParams):
+    for results in api.iter_pages(supplier, paginationParams):
+        print(results)
+
+        i = input('n(next) / q(quit): ')
+        if not (i == 'n' or i == 'next'):
+            return
+
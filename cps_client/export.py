@@ -0,0 +1,151 @@
+"""Streams transfers out of CPS into flat CSV, JSON Lines or Parquet files.
+
+Transfers are paged through ``get_transfers`` and written a batch of rows at a time, so memory
+use doesn't grow with the size of the export.
+"""
+
+import csv
+import itertools
+import sys
+
+from . import api
+from .api import codec
+
+
+COLUMNS = (
+    "id",
+    "createDate",
+    "status",
+    "sourceType",
+    "sourceId",
+    "sourceAddress",
+    "sourceChain",
+    "destinationType",
+    "destinationId",
+    "destinationAddress",
+    "destinationChain",
+    "amount",
+    "currency",
+    "transactionHash",
+)
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def _location(location):
+    return (
+        location.type,
+        getattr(location, "id", None),
+        getattr(location, "address", None),
+        getattr(location, "chain", None),
+    )
+
+def transfer_row(transfer):
+    """Flattens a Transfer into a tuple of COLUMNS."""
+    return (
+        transfer.id,
+        transfer.createDate,
+        transfer.status,
+        *_location(transfer.source),
+        *_location(transfer.destination),
+        transfer.amount.amount,
+        transfer.amount.currency,
+        transfer.transactionHash,
+    )
+
+class CSVWriter:
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+class JSONLWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, rows):
+        lines = []
+        for row in rows:
+            line = codec.dumps(dict(zip(COLUMNS, row)))
+            lines.append(line.decode() if isinstance(line, bytes) else line)
+        lines.append("")
+        self.f.write("\n".join(lines))
+
+    def close(self):
+        pass
+
+class ParquetWriter:
+    """Writes each batch as a Parquet row group. Needs pyarrow."""
+
+    def __init__(self, f):
+        # imported here as pyarrow is optional and slow to import
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("parquet export requires pyarrow: pip install cps-client[parquet]")
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(c, pyarrow.string()) for c in COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(f, self.schema)
+
+    def write(self, rows):
+        pyarrow = self.pyarrow
+        columns = [pyarrow.array(column, pyarrow.string()) for column in zip(*rows)]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {
+    "csv": CSVWriter,
+    "jsonl": JSONLWriter,
+    "parquet": ParquetWriter,
+}
+
+def write_transfers(transfers, f, format="csv", batch_size=1000):
+    """Writes transfers to the open file f, batch_size rows at a time, and returns how many were
+    written. f must be opened in binary mode for parquet and text mode (newline="" for csv)
+    otherwise."""
+    writer = WRITERS[format](f)
+    count = 0
+    try:
+        rows = (transfer_row(t) for t in transfers)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            writer.write(batch)
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+def export_transfers(client, path=None, format="csv", from_=None, to=None,
+        sourceWalletId=None, destinationWalletId=None, pageSize=50, batch_size=1000):
+    """Exports every transfer matching the filters to path, or stdout when path is None, and
+    returns how many were written. The next page is prefetched while the current one is written.
+    """
+    transfers = client.iter_transfers(
+            api.PaginationParams(pageSize=pageSize),
+            api.DateTimeParams(from_, to),
+            api.TransferParams(sourceWalletId, destinationWalletId),
+            prefetch=True)
+
+    if path is None:
+        if format == "parquet":
+            raise ValueError("parquet can't be written to stdout")
+        return write_transfers(transfers, sys.stdout, format, batch_size)
+
+    if format == "parquet":
+        with open(path, "wb") as f:
+            return write_transfers(transfers, f, format, batch_size)
+
+    # a large buffer so rows reach the disk in big writes
+    with open(path, "w", newline="", buffering=1 << 20) as f:
+        return write_transfers(transfers, f, format, batch_size)
@@ -0,0 +1,314 @@
+"""Receives the notifications CPS sends to a subscription's endpoint.
+
+CPS delivers notifications through Amazon SNS: each POST carries an SNS message whose
+``Message`` is the CPS notification. ``NotificationReceiver`` confirms the subscription when SNS
+asks, parses transfer and wallet notifications into ``Transfer`` and ``Wallet`` models, drops
+repeated deliveries and queues the rest for the application:
+
+    receiver = NotificationReceiver()
+    runner = await receiver.serve(port=8080)
+    async for notification in receiver:
+        if notification.transfer is not None:
+            print(notification.transfer.id, notification.transfer.status)
+
+The receiver is also an ASGI application, to mount under any ASGI server instead of ``serve``.
+"""
+
+import asyncio
+import base64
+import hashlib
+import importlib.util
+import re
+from collections import OrderedDict
+
+from . import api
+from .api import codec
+
+
+# only SNS itself is asked to confirm a subscription, or trusted to serve signing certificates
+SUBSCRIBE_URL = re.compile(r"^https://sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?/")
+SIGNING_CERT_URL = SUBSCRIBE_URL
+
+# the fields an SNS signature covers, in the order they're signed, by message type
+SIGNED_FIELDS = {
+    "Notification": ("Message", "MessageId", "Subject", "Timestamp", "TopicArn", "Type"),
+    "SubscriptionConfirmation": ("Message", "MessageId", "SubscribeURL", "Timestamp", "Token", "TopicArn", "Type"),
+    "UnsubscribeConfirmation": ("Message", "MessageId", "SubscribeURL", "Timestamp", "Token", "TopicArn", "Type"),
+}
+
+# SignatureVersion -> the name of the hash its RSASSA-PKCS1-v1_5 signature is made with
+SIGNATURE_VERSIONS = {
+    "1": "SHA1",
+    "2": "SHA256",
+}
+
+def public_key(pem):
+    """The public key of a PEM X.509 certificate. Needs cryptography; the certificate is trusted
+    for where it was fetched from."""
+    from cryptography import x509
+
+    return x509.load_pem_x509_certificate(pem.encode("ascii") if isinstance(pem, str) else pem).public_key()
+
+def verify_signature(key, signature, data, version):
+    """Whether signature is an RSASSA-PKCS1-v1_5 signature of data by key, with the hash of
+    SignatureVersion version."""
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+    if not isinstance(key, rsa.RSAPublicKey):
+        return False
+    try:
+        key.verify(signature, data, padding.PKCS1v15(), getattr(hashes, SIGNATURE_VERSIONS[version])())
+    except InvalidSignature:
+        return False
+    return True
+
+def string_to_sign(message):
+    """The string SNS signs for message, or None for a type it doesn't sign."""
+    fields = SIGNED_FIELDS.get(message.get("Type"))
+    if fields is None:
+        return None
+    return "".join("{}\n{}\n".format(f, message[f]) for f in fields if f in message).encode("utf-8")
+
+
+class Notification:
+    """A CPS notification. type is its notificationType, e.g. "transfers"; transfer or wallet is
+    set for those types and json holds the whole notification either way."""
+
+    def __init__(self, id, type, json_):
+        self.id = id
+        self.type = type
+        self.json = json_
+        self.transfer = None
+        self.wallet = None
+        if type == "transfers" and "transfer" in json_:
+            self.transfer = api.Transfer.from_json(json_["transfer"])
+        elif type == "wallets" and "wallet" in json_:
+            self.wallet = api.Wallet.from_json(json_["wallet"])
+
+    def __repr__(self):
+        return "Notification({!r}, {!r})".format(self.id, self.type)
+
+class NotificationReceiver:
+    """Accepts SNS deliveries and queues the notifications they carry.
+
+    Every delivery must carry a valid SNS signature, made with a certificate served from an SNS
+    host (see SIGNING_CERT_URL), or it's answered with a 403 and dropped. Certificates are
+    fetched once and kept in certificates, a dict of URL -> PEM that can also be filled up front
+    for hosts that can't reach SNS. verify=False accepts unsigned deliveries, e.g. from a test
+    sender; never expose such a receiver to the internet. Verifying needs the ``sns`` extra,
+    ``pip install cps-client[sns]``.
+
+    At most queue_size notifications wait to be consumed. When the queue stays full for
+    put_timeout seconds the delivery is answered with a 503, which SNS retries later, so a slow
+    consumer pushes back on the sender rather than growing memory. The ids of the last
+    dedupe_size messages are remembered to drop repeated deliveries. Given an index, a
+    ``TransferIndex``, every transfer notification updates it as it arrives, before it is
+    queued. ``stats`` counts what happened to every delivery.
+    """
+
+    def __init__(self, queue_size=10000, put_timeout=1.0, dedupe_size=100000, max_body=1 << 20, confirm=True, index=None, verify=True, certificates=None):
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self.dedupe_size = dedupe_size
+        self.max_body = max_body
+        self.confirm = confirm
+        self.index = index
+        if verify and importlib.util.find_spec("cryptography") is None:
+            raise ImportError("verifying SNS signatures requires cryptography: pip install cps-client[sns]")
+        self.verify = verify
+        self.certificates = certificates if certificates is not None else {}
+        self.stats = { "received": 0, "duplicates": 0, "rejected": 0, "invalid": 0, "unverified": 0, "confirmations": 0 }
+        self._seen = OrderedDict()
+        self._queue = None
+        # signing certificate URL -> its public key
+        self._keys = {}
+
+    @property
+    def queue(self):
+        # created on first use so it belongs to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        return self._queue
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    def _first_delivery(self, id):
+        if id in self._seen:
+            self._seen.move_to_end(id)
+            return False
+        self._seen[id] = None
+        if len(self._seen) > self.dedupe_size:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _confirm(self, url):
+        if not SUBSCRIBE_URL.match(url):
+            raise ValueError("not an SNS subscribe URL: " + url)
+        import urllib.request
+
+        def get():
+            with urllib.request.urlopen(url, timeout=10) as res:
+                res.read()
+        await asyncio.get_running_loop().run_in_executor(None, get)
+
+    async def _public_key(self, url):
+        key = self._keys.get(url)
+        if key is not None:
+            return key
+
+        pem = self.certificates.get(url)
+        if pem is None:
+            import urllib.request
+
+            def get():
+                with urllib.request.urlopen(url, timeout=10) as res:
+                    return res.read(1 << 16)
+            pem = await asyncio.get_running_loop().run_in_executor(None, get)
+        key = self._keys[url] = public_key(pem)
+        self.certificates[url] = pem
+        return key
+
+    async def _verified(self, message):
+        """Whether message is signed by SNS. Raises OSError if the certificate can't be fetched."""
+        try:
+            url = message["SigningCertURL"]
+            signature = base64.b64decode(message["Signature"], validate=True)
+            version = message["SignatureVersion"]
+        except (KeyError, TypeError, ValueError):
+            return False
+        data = string_to_sign(message)
+        if data is None or version not in SIGNATURE_VERSIONS or not isinstance(url, str) or not SIGNING_CERT_URL.match(url):
+            return False
+
+        try:
+            key = await self._public_key(url)
+        except ValueError:
+            # not a certificate we can read
+            return False
+        return verify_signature(key, signature, data, version)
+
+    async def handle(self, body):
+        """Handles one delivery's body and returns the HTTP status to answer it with."""
+        if len(body) > self.max_body:
+            self.stats["invalid"] += 1
+            return 413
+        try:
+            message = codec.loads(body)
+            type = message.get("Type", "Notification")
+            id = message.get("MessageId") or hashlib.sha1(body).hexdigest()
+        except (ValueError, AttributeError):
+            self.stats["invalid"] += 1
+            return 400
+
+        if self.verify:
+            # before anything else, so a forged message can't even mark its id as seen
+            try:
+                verified = await self._verified(message)
+            except OSError:
+                # SNS retries a 5xx, by when the certificate may be reachable
+                return 503
+            if not verified:
+                self.stats["unverified"] += 1
+                return 403
+
+        if type == "SubscriptionConfirmation":
+            if self.confirm:
+                try:
+                    await self._confirm(message["SubscribeURL"])
+                except (KeyError, ValueError, OSError):
+                    self.stats["invalid"] += 1
+                    return 400
+                self.stats["confirmations"] += 1
+            return 200
+        if type != "Notification":
+            return 200
+
+        if not self._first_delivery(id):
+            self.stats["duplicates"] += 1
+            return 200
+
+        try:
+            # SNS wraps the notification in a string; a bare notification is accepted too
+            json_ = message["Message"] if "Message" in message else message
+            if isinstance(json_, str):
+                json_ = codec.loads(json_)
+            notification = Notification(id, json_.get("notificationType"), json_)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.stats["invalid"] += 1
+            return 400
+
+        if self.index is not None:
+            self.index.apply(notification)
+
+        try:
+            # wait_for costs a task per call, so only pay for it when the queue is full
+            self.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(notification), self.put_timeout)
+            except asyncio.TimeoutError:
+                # forget it so that SNS's retry isn't dropped as a duplicate
+                self._seen.pop(id, None)
+                self.stats["rejected"] += 1
+                return 503
+        self.stats["received"] += 1
+        return 200
+
+    async def __call__(self, scope, receive, send):
+        """ASGI entry point."""
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({ "type": "lifespan.startup.complete" })
+                elif message["type"] == "lifespan.shutdown":
+                    await send({ "type": "lifespan.shutdown.complete" })
+                    return
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] != "POST":
+            status = 405
+        else:
+            chunks = []
+            size = 0
+            more = True
+            while more:
+                message = await receive()
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_body:
+                    chunks.append(chunk)
+                more = message.get("more_body", False)
+            if size > self.max_body:
+                self.stats["invalid"] += 1
+                status = 413
+            else:
+                status = await self.handle(b"".join(chunks))
+
+        await send({ "type": "http.response.start", "status": status, "headers": [(b"content-length", b"0")] })
+        await send({ "type": "http.response.body", "body": b"" })
+
+    async def serve(self, host="0.0.0.0", port=8080, path="/"):
+        """Starts a standalone aiohttp server receiving POSTs on path and returns its runner;
+        ``await runner.cleanup()`` stops it. Requires the ``async`` extra."""
+        try:
+            from aiohttp import web
+        except ImportError:
+            raise ImportError("serve requires aiohttp: pip install cps-client[async]")
+
+        async def post(request):
+            return web.Response(status=await self.handle(await request.read()))
+
+        app = web.Application(client_max_size=self.max_body)
+        app.router.add_post(path, post)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
@@ -0,0 +1,265 @@
+"""A local SQLite mirror of transfers, wallets and addresses.
+
+``SyncEngine`` pulls what changed since its last run into a ``SyncStore``, which then answers
+queries by wallet, status or date without going back to CPS:
+
+    with SyncStore("cps.db") as store:
+        SyncEngine(client, store).sync()
+        pending = store.transfers(status="pending")
+"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from . import api
+from .api.backfill import format_datetime
+from .export import COLUMNS, transfer_row
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    id TEXT PRIMARY KEY,
+    createDate TEXT,
+    status TEXT,
+    sourceType TEXT,
+    sourceId TEXT,
+    sourceAddress TEXT,
+    sourceChain TEXT,
+    destinationType TEXT,
+    destinationId TEXT,
+    destinationAddress TEXT,
+    destinationChain TEXT,
+    amount TEXT,
+    currency TEXT,
+    transactionHash TEXT
+);
+CREATE INDEX IF NOT EXISTS transfers_source ON transfers (sourceId);
+CREATE INDEX IF NOT EXISTS transfers_destination ON transfers (destinationId);
+CREATE INDEX IF NOT EXISTS transfers_status ON transfers (status);
+CREATE INDEX IF NOT EXISTS transfers_created ON transfers (createDate);
+
+CREATE TABLE IF NOT EXISTS wallets (
+    walletId TEXT PRIMARY KEY,
+    balances TEXT
+);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    address TEXT PRIMARY KEY,
+    walletId TEXT,
+    currency TEXT,
+    chain TEXT
+);
+CREATE INDEX IF NOT EXISTS addresses_wallet ON addresses (walletId);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UPSERT_TRANSFER = "INSERT OR REPLACE INTO transfers ({}) VALUES ({})".format(
+        ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS)))
+
+
+def _location(type, id, address, chain):
+    if type == "wallet":
+        return api.WalletLocation(id, address)
+    return api.BlockchainLocation(address, chain)
+
+def _transfer(row):
+    (id, createDate, status,
+        sourceType, sourceId, sourceAddress, sourceChain,
+        destinationType, destinationId, destinationAddress, destinationChain,
+        amount, currency, transactionHash) = row
+    return api.Transfer(
+            id,
+            _location(sourceType, sourceId, sourceAddress, sourceChain),
+            _location(destinationType, destinationId, destinationAddress, destinationChain),
+            api.Money(amount, currency),
+            status,
+            transactionHash,
+            createDate)
+
+class SyncStore:
+    """On-disk store of CPS records. Writes are batched in one transaction per call."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    """ checkpoints """
+
+    def checkpoint(self, name):
+        row = self.db.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, name, value):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO checkpoints (name, value) VALUES (?, ?)", (name, value))
+
+    """ writes """
+
+    def put_transfers(self, transfers):
+        with self.db:
+            self.db.executemany(_UPSERT_TRANSFER, [transfer_row(t) for t in transfers])
+
+    def put_wallets(self, wallets):
+        rows = [(w.walletId, json.dumps([m.to_json() for m in w.balances])) for w in wallets]
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO wallets (walletId, balances) VALUES (?, ?)", rows)
+
+    def put_addresses(self, walletId, addresses):
+        rows = [(a.address, walletId, a.currency, a.chain) for a in addresses]
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO addresses (address, walletId, currency, chain) VALUES (?, ?, ?, ?)", rows)
+
+    """ queries """
+
+    def transfer(self, id):
+        row = self.db.execute("SELECT {} FROM transfers WHERE id = ?".format(", ".join(COLUMNS)), (id,)).fetchone()
+        return _transfer(row) if row else None
+
+    def transfers(self, walletId=None, status=None, from_=None, to=None):
+        """Transfers touching walletId (as source or destination), with status, created between
+        from_ and to (inclusive), newest first. Every argument is optional."""
+        clauses, args = [], []
+        if walletId is not None:
+            clauses.append("(sourceId = ? OR destinationId = ?)")
+            args += [walletId, walletId]
+        if status is not None:
+            clauses.append("status = ?")
+            args.append(status)
+        if from_ is not None:
+            clauses.append("createDate >= ?")
+            args.append(from_)
+        if to is not None:
+            clauses.append("createDate <= ?")
+            args.append(to)
+
+        query = "SELECT {} FROM transfers".format(", ".join(COLUMNS))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY createDate DESC"
+        return [_transfer(row) for row in self.db.execute(query, args)]
+
+    def pending_transfers(self):
+        placeholders = ", ".join("?" * len(api.Transfer.FINAL_STATUSES))
+        query = "SELECT {} FROM transfers WHERE status NOT IN ({})".format(", ".join(COLUMNS), placeholders)
+        return [_transfer(row) for row in self.db.execute(query, api.Transfer.FINAL_STATUSES)]
+
+    def wallet(self, walletId):
+        row = self.db.execute("SELECT walletId, balances FROM wallets WHERE walletId = ?", (walletId,)).fetchone()
+        return api.Wallet.from_json({ "walletId": row[0], "balances": json.loads(row[1]) }) if row else None
+
+    def wallets(self):
+        rows = self.db.execute("SELECT walletId, balances FROM wallets ORDER BY walletId")
+        return [api.Wallet.from_json({ "walletId": w, "balances": json.loads(b) }) for w, b in rows]
+
+    def addresses(self, walletId):
+        rows = self.db.execute("SELECT address, currency, chain FROM addresses WHERE walletId = ?", (walletId,))
+        return [api.Address(*row) for row in rows]
+
+class SyncEngine:
+    """Brings a SyncStore up to date with CPS.
+
+    Transfers are pulled from the newest createDate already stored, and stored transfers that
+    aren't final yet are refreshed with a ``TransferWatcher`` round. The checkpoint is
+    inclusive, so the transfers created at that instant are pulled again. Wallets and addresses have
+    no createDate in their models, so their checkpoints are the local time a sync started, less
+    overlap to absorb clock skew; re-storing a record is harmless.
+    """
+
+    def __init__(self, client, store, pageSize=50, overlap=timedelta(minutes=5)):
+        self.client = client
+        self.store = store
+        self.pageSize = pageSize
+        self.overlap = overlap
+
+    def _page(self, iterator, put, batch=500):
+        count = 0
+        items = []
+        for item in iterator:
+            items.append(item)
+            if len(items) == batch:
+                put(items)
+                count += len(items)
+                items = []
+        put(items)
+        return count + len(items)
+
+    def _now(self):
+        return format_datetime(datetime.now(timezone.utc) - self.overlap)
+
+    def sync_transfers(self):
+        """Stores transfers created since the last sync and returns how many were pulled."""
+        newest = [self.store.checkpoint("transfers")]
+
+        def put(transfers):
+            self.store.put_transfers(transfers)
+            newest[0] = max([d for d in [newest[0]] + [t.createDate for t in transfers] if d is not None], default=None)
+
+        count = self._page(
+                self.client.iter_transfers(api.PaginationParams(pageSize=self.pageSize), api.DateTimeParams(from_=newest[0]), prefetch=True),
+                put)
+
+        if newest[0] is not None:
+            self.store.set_checkpoint("transfers", newest[0])
+        return count
+
+    def refresh_pending(self):
+        """Refreshes stored transfers that aren't final, storing their status whether it's final
+        or not, and returns those that became final."""
+        refreshed = []
+        watcher = api.TransferWatcher(self.client, pageSize=self.pageSize, on_refresh=refreshed.append)
+        for t in self.store.pending_transfers():
+            watcher.watch(t)
+        if not watcher.pending:
+            return []
+
+        final = watcher.poll()
+        self.store.put_transfers(refreshed)
+        return final
+
+    def sync_wallets(self, all=False):
+        """Stores wallets created since the last sync, or every wallet (to refresh balances) with
+        all. Returns how many were pulled."""
+        started = self._now()
+        since = None if all else self.store.checkpoint("wallets")
+        count = self._page(
+                self.client.iter_wallets(api.PaginationParams(pageSize=self.pageSize), api.DateTimeParams(from_=since), prefetch=True),
+                self.store.put_wallets)
+        self.store.set_checkpoint("wallets", started)
+        return count
+
+    def sync_addresses(self, walletId):
+        """Stores the wallet's addresses created since its last sync and returns how many."""
+        name = "addresses:" + walletId
+        started = self._now()
+        count = self._page(
+                self.client.iter_wallet_addresses(walletId, api.PaginationParams(pageSize=self.pageSize), api.DateTimeParams(from_=self.store.checkpoint(name))),
+                lambda addresses: self.store.put_addresses(walletId, addresses))
+        self.store.set_checkpoint(name, started)
+        return count
+
+    def sync(self, addresses=False, balances=True):
+        """Runs every step: new transfers, pending transfers, wallets and, with addresses, new
+        addresses of every stored wallet. With balances every wallet is pulled again to bring
+        the stored balances up to date; without it only new wallets are, and the balances of
+        those already stored go stale."""
+        self.sync_transfers()
+        self.refresh_pending()
+        self.sync_wallets(all=balances)
+        if addresses:
+            for wallet in self.store.wallets():
+                self.sync_addresses(wallet.walletId)
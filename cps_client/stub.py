@@ -0,0 +1,471 @@
+"""A local stand-in for the CPS API, to test and benchmark against without credentials.
+
+``StubServer`` implements configuration, wallets, addresses, transfers and notification
+subscriptions in memory, with CPS's cursor pagination (newest first) and date filters. It can
+add latency and answer a share of requests with 500s or 429s, to exercise retries and rate
+limiting:
+
+    with StubServer(latency=0.005, error_rate=0.01, throttle_rate=0.01, transfers=1000) as stub:
+        client = api.Client(stub.url, "any key")
+
+or from a shell, serving until interrupted:
+
+    python -m cps_client.stub --port 8080 --latency 0.005 --transfers 1000
+
+Created transfers are pending until settle seconds have passed, then complete.
+"""
+
+import argparse
+import bisect
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .api.backfill import format_datetime, parse_datetime
+
+
+MAX_PAGE_SIZE = 50
+# chains an address can be created on, per currency
+CHAINS = {
+    "USD": ("ALGO", "AVAX", "ETH", "FLOW", "HBAR", "MATIC", "SOL", "TRX", "XLM"),
+    "BTC": ("BTC",),
+    "ETH": ("ETH",),
+}
+
+
+class StubError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        self.message = message
+
+def _page_size(query):
+    try:
+        size = int(query.get("pageSize", MAX_PAGE_SIZE))
+    except ValueError:
+        raise StubError(400, "pageSize must be a number")
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise StubError(400, "pageSize must be between 1 and {}".format(MAX_PAGE_SIZE))
+    return size
+
+def _date(value):
+    """value in the format createDates are stored in, so the two compare as strings."""
+    try:
+        return format_datetime(parse_datetime(value))
+    except ValueError:
+        raise StubError(400, "dates must be ISO-8601")
+
+class Records:
+    """Records in the order they were created, with the position of each id and the createDates,
+    which only go up, so a page is found without scanning everything before it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.positions = {}
+        self.dates = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        self.positions[item[self.key]] = len(self.items)
+        self.items.append(item)
+        self.dates.append(item["createDate"])
+        return item
+
+    def get(self, id):
+        position = self.positions.get(id)
+        return None if position is None else self.items[position]
+
+    def page(self, query, match=None):
+        """CPS cursor pagination, newest first: pageAfter pages towards older records and
+        pageBefore towards newer ones. from and to filter on createDate, and match on anything."""
+        size = _page_size(query)
+        if "pageBefore" in query and "pageAfter" in query:
+            raise StubError(400, "cannot specify both pageBefore and pageAfter")
+
+        # the records in items[lo:hi] are candidates
+        lo, hi = 0, len(self.items)
+        if "from" in query:
+            lo = bisect.bisect_left(self.dates, _date(query["from"]))
+        if "to" in query:
+            hi = bisect.bisect_right(self.dates, _date(query["to"]))
+        for cursor in ("pageAfter", "pageBefore"):
+            if cursor in query and query[cursor] not in self.positions:
+                return []
+        if "pageAfter" in query:
+            hi = min(hi, self.positions[query["pageAfter"]])
+        if "pageBefore" in query:
+            lo = max(lo, self.positions[query["pageBefore"]] + 1)
+
+        page = []
+        if "pageBefore" in query:
+            # the newer records closest to the cursor
+            positions = range(lo, hi)
+        else:
+            positions = range(hi - 1, lo - 1, -1)
+        for i in positions:
+            if match is None or match(self.items[i]):
+                page.append(self.items[i])
+                if len(page) == size:
+                    break
+        if "pageBefore" in query:
+            page.reverse()
+        return page
+
+class StubState:
+    """The records a StubServer serves."""
+
+    def __init__(self, wallets=0, transfers=0, settle=1.0, seed=None):
+        self.settle = settle
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.wallets = Records("walletId")
+        self.addresses = {}
+        self.transfers = Records("id")
+        self.subscriptions = []
+        # idempotency key -> response, so a resent create returns what the first one did
+        self.created = {}
+
+        self.masterWalletId = self._add_wallet()["walletId"]
+        for _ in range(wallets):
+            self._add_wallet()
+        self._seed_transfers(transfers)
+
+    def _now(self):
+        return format_datetime(datetime.now(timezone.utc))
+
+    def _add_wallet(self, description=None):
+        wallet = {
+            "walletId": str(1000000000 + len(self.wallets)),
+            "entityId": "00000000-0000-4000-8000-000000000000",
+            "type": "merchant" if not len(self.wallets) else "end_user_wallet",
+            "description": description,
+            "balances": [],
+            "createDate": self._now(),
+        }
+        if not len(self.wallets):
+            wallet["balances"] = [{ "amount": "1000000.00", "currency": "USD" }]
+        self.addresses[wallet["walletId"]] = Records("address")
+        return self.wallets.add(wallet)
+
+    def _seed_transfers(self, n):
+        # settled transfers, a minute apart up to now
+        start = datetime.now(timezone.utc) - timedelta(minutes=n)
+        for i in range(n):
+            destination = self.random.choice(self.wallets.items)["walletId"]
+            self._add_transfer(
+                    { "type": "wallet", "id": self.masterWalletId },
+                    { "type": "wallet", "id": destination },
+                    { "amount": "{}.{:02d}".format(self.random.randrange(1, 1000), self.random.randrange(100)), "currency": "USD" },
+                    "failed" if self.random.random() < 0.02 else "complete",
+                    format_datetime(start + timedelta(minutes=i)))
+
+    def _add_transfer(self, source, destination, amount, status, createDate):
+        transfer = {
+            "id": str(uuid.UUID(int=self.random.getrandbits(128), version=4)),
+            "source": source,
+            "destination": destination,
+            "amount": amount,
+            "status": status,
+            "createDate": createDate,
+        }
+        if destination["type"] == "blockchain" and status == "complete":
+            transfer["transactionHash"] = "0x" + "%064x" % self.random.getrandbits(256)
+        return self.transfers.add(transfer)
+
+    def transfer(self, transfer):
+        """transfer as it stands now: pending ones complete once they are settle seconds old."""
+        if transfer["status"] == "pending":
+            age = (datetime.now(timezone.utc) - parse_datetime(transfer["createDate"])).total_seconds()
+            if age >= self.settle:
+                transfer["status"] = "complete"
+                if transfer["destination"]["type"] == "blockchain":
+                    transfer["transactionHash"] = "0x" + "%064x" % self.random.getrandbits(256)
+        return transfer
+
+    def wallet(self, walletId):
+        wallet = self.wallets.get(walletId)
+        if wallet is None:
+            raise StubError(404, "wallet not found")
+        return wallet
+
+    def idempotent(self, body, create):
+        key = body.get("idempotencyKey")
+        if not key:
+            raise StubError(400, "idempotencyKey is required")
+        if key not in self.created:
+            self.created[key] = create()
+        return self.created[key]
+
+    """ endpoints """
+
+    def get_configuration(self, query):
+        return { "payments": { "masterWalletId": self.masterWalletId } }
+
+    def create_wallet(self, body):
+        return self.idempotent(body, lambda: self._add_wallet(body.get("description")))
+
+    def get_wallets(self, query):
+        return self.wallets.page(query)
+
+    def get_wallet(self, query, walletId):
+        return self.wallet(walletId)
+
+    def create_wallet_address(self, body, walletId):
+        self.wallet(walletId)
+        currency = body.get("currency")
+        chain = body.get("chain")
+        if chain not in CHAINS.get(currency, ()):
+            raise StubError(400, "unsupported currency or chain")
+
+        def create():
+            address = {
+                "address": "0x" + "%040x" % self.random.getrandbits(160),
+                "currency": currency,
+                "chain": chain,
+                "createDate": self._now(),
+            }
+            return self.addresses[walletId].add(address)
+        return self.idempotent(body, create)
+
+    def get_wallet_addresses(self, query, walletId):
+        self.wallet(walletId)
+        return self.addresses[walletId].page(query)
+
+    def create_transfer(self, body):
+        try:
+            source, destination, amount = body["source"], body["destination"], body["amount"]
+            if source["type"] != "wallet" or destination["type"] not in ("wallet", "blockchain"):
+                raise StubError(400, "unsupported source or destination")
+            if float(amount["amount"]) <= 0:
+                raise StubError(400, "amount must be positive")
+        except (KeyError, TypeError, ValueError):
+            raise StubError(400, "invalid transfer")
+        self.wallet(source["id"])
+        if destination["type"] == "wallet":
+            self.wallet(destination["id"])
+
+        return self.idempotent(body, lambda: self._add_transfer(source, destination, amount, "pending", self._now()))
+
+    def get_transfers(self, query):
+        source = query.get("sourceWalletId")
+        destination = query.get("destinationWalletId")
+        match = None
+        if source is not None or destination is not None:
+            def match(t):
+                return ((source is None or t["source"].get("id") == source)
+                        and (destination is None or t["destination"].get("id") == destination))
+        return [self.transfer(t) for t in self.transfers.page(query, match)]
+
+    def get_transfer(self, query, id):
+        transfer = self.transfers.get(id)
+        if transfer is None:
+            raise StubError(404, "transfer not found")
+        return self.transfer(transfer)
+
+    def create_subscription(self, body):
+        if not body.get("endpoint", "").startswith("https://"):
+            raise StubError(400, "endpoint must be an https URL")
+        subscription = {
+            "id": str(uuid.UUID(int=self.random.getrandbits(128), version=4)),
+            "endpoint": body["endpoint"],
+            "subscriptionDetails": [{ "url": "arn:aws:sns:us-east-1:000000000000:cps", "status": "confirmed" }],
+        }
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def get_subscriptions(self, query):
+        return self.subscriptions
+
+    def delete_subscription(self, query, id):
+        for s in self.subscriptions:
+            if s["id"] == id:
+                self.subscriptions.remove(s)
+                return {}
+        raise StubError(404, "subscription not found")
+
+# (method, path pattern, StubState method); GETs and DELETEs get the query, POSTs the body
+ROUTES = [(method, re.compile("^/v1" + pattern + "$"), name) for method, pattern, name in [
+    ("GET", "/configuration", "get_configuration"),
+    ("POST", "/wallets", "create_wallet"),
+    ("GET", "/wallets", "get_wallets"),
+    ("GET", "/wallets/([^/]+)", "get_wallet"),
+    ("POST", "/wallets/([^/]+)/addresses", "create_wallet_address"),
+    ("GET", "/wallets/([^/]+)/addresses", "get_wallet_addresses"),
+    ("POST", "/transfers", "create_transfer"),
+    ("GET", "/transfers", "get_transfers"),
+    ("GET", "/transfers/([^/]+)", "get_transfer"),
+    ("POST", "/notifications/subscriptions", "create_subscription"),
+    ("GET", "/notifications/subscriptions", "get_subscriptions"),
+    ("DELETE", "/notifications/subscriptions/([^/]+)", "delete_subscription"),
+]]
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # one handler serves every request on a keep-alive connection
+        self.server.stub.count("connections")
+
+    def do_GET(self):
+        self.handle_call("GET")
+
+    def do_POST(self):
+        self.handle_call("POST")
+
+    def do_DELETE(self):
+        self.handle_call("DELETE")
+
+    def handle_call(self, method):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        delay = stub.latency + (stub.jitter * stub.random.random() if stub.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        url = urlsplit(self.path)
+        query = { k: v[-1] for k, v in parse_qs(url.query).items() }
+        try:
+            stub.count("requests")
+            if stub.api_key is not None and self.headers.get("Authorization") != "Bearer " + stub.api_key:
+                raise StubError(401, "invalid API key")
+            if stub.throttle_rate and stub.random.random() < stub.throttle_rate:
+                stub.count("throttled")
+                self.send_json(429, { "code": 429, "message": "too many requests" }, { "Retry-After": str(stub.retry_after) })
+                return
+            if stub.error_rate and stub.random.random() < stub.error_rate:
+                stub.count("errors")
+                raise StubError(500, "injected error")
+
+            for route_method, pattern, name in ROUTES:
+                m = pattern.match(url.path)
+                if m is None or route_method != method:
+                    continue
+                if method == "POST":
+                    try:
+                        arg = json.loads(raw or b"{}")
+                    except ValueError:
+                        raise StubError(400, "body must be JSON")
+                else:
+                    arg = query
+                with stub.state.lock:
+                    data = getattr(stub.state, name)(arg, *m.groups())
+                    body = json.dumps({ "data": data })
+                self.send_json(201 if method == "POST" else 200, body)
+                return
+            raise StubError(404, "no such resource")
+        except StubError as e:
+            self.send_json(e.status, { "code": e.status, "message": e.message })
+
+    def send_json(self, status, body, headers=None):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class _HTTPServer(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections a concurrent client opens at once
+    request_queue_size = 1024
+    daemon_threads = True
+
+class StubServer:
+    """Serves a ``StubState`` over HTTP on a background thread once started; port 0 picks a free
+    port, see url.
+
+    Each request waits latency seconds plus up to jitter more. A share error_rate of requests
+    gets a 500 and a share throttle_rate a 429 with a Retry-After of retry_after seconds. With
+    api_key, requests without it are answered 401. ``stats`` counts the connections accepted,
+    and requests, errors and throttled requests.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+            retry_after=1, api_key=None, wallets=0, transfers=0, settle=1.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.api_key = api_key
+        self.random = random.Random(seed)
+        self.state = StubState(wallets, transfers, settle, seed)
+        self.stats = { "connections": 0, "requests": 0, "errors": 0, "throttled": 0 }
+        self._stats_lock = threading.Lock()
+        self.server = _HTTPServer((host, port), StubHandler)
+        self.server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="cps-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of the 429s, in seconds")
+    parser.add_argument("--api-key", default=None, help="reject requests without this key")
+    parser.add_argument("--wallets", type=int, default=10, help="end user wallets to start with")
+    parser.add_argument("--transfers", type=int, default=1000, help="settled transfers to start with")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds until a created transfer completes")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stub = StubServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.throttle_rate,
+            args.retry_after, args.api_key, args.wallets, args.transfers, args.settle, args.seed)
+    print("serving the CPS stub on " + stub.url, flush=True)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
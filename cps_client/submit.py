@@ -0,0 +1,148 @@
+"""Submits transfers listed in a CSV or JSON Lines file and records the outcome of every row.
+
+The results file has the input columns plus transferId, status and error, so it can be fed back
+in as input to resume: rows that already have a transferId are passed through untouched and the
+rest are submitted again with the idempotency key recorded for them. Rows without a key get a
+random one, which is saved in the results file before anything is submitted.
+"""
+
+import csv
+import os
+
+from . import api
+from .api import codec
+
+
+COLUMNS = (
+    "sourceWalletId",
+    "destinationWalletId",
+    "destinationAddress",
+    "destinationChain",
+    "amount",
+    "currency",
+    "idempotencyKey",
+)
+
+RESULT_COLUMNS = COLUMNS + ("transferId", "status", "error")
+
+FORMATS = ("csv", "jsonl")
+
+
+def guess_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def read_rows(f, format="csv"):
+    """Reads every row of f into a list of dicts keyed by column."""
+    if format == "csv":
+        return [dict(row) for row in csv.DictReader(f)]
+    return [codec.loads(line) for line in f if line.strip()]
+
+def as_request(row):
+    """Builds the CreateTransferRequest for a row, with the row's idempotencyKey or a new random
+    one, or raises ValueError when the row is incomplete."""
+    if not row.get("sourceWalletId"):
+        raise ValueError("missing sourceWalletId")
+    if not row.get("amount"):
+        raise ValueError("missing amount")
+
+    if row.get("destinationWalletId"):
+        destination = api.WalletLocation(row["destinationWalletId"])
+    elif row.get("destinationAddress"):
+        destination = api.BlockchainLocation(row["destinationAddress"], row.get("destinationChain") or "ETH")
+    else:
+        raise ValueError("missing destinationWalletId or destinationAddress")
+
+    return api.CreateTransferRequest(
+            api.WalletLocation(row["sourceWalletId"]),
+            destination,
+            api.Money(str(row["amount"]), row.get("currency") or "USD"),
+            row.get("idempotencyKey") or None)
+
+def plan_rows(rows):
+    """Builds the request of every row still to be submitted and records its idempotency key in
+    the row. Returns (row, request) pairs, request being None for rows that already have a
+    transferId or are invalid, whose error is set.
+
+    A row submitted with a new key is a new transfer, so rows should be saved with their keys,
+    e.g. with ``save_rows``, before they're submitted: after a crash they're resubmitted with
+    the same keys instead of paying twice.
+    """
+    plan = []
+    for row in rows:
+        if row.get("transferId"):
+            plan.append((row, None))
+            continue
+        try:
+            req = as_request(row)
+        except ValueError as e:
+            row["error"] = "invalid row: {}".format(e)
+            plan.append((row, None))
+            continue
+        row["idempotencyKey"] = req.idempotencyKey
+        row["currency"] = req.amount.currency
+        plan.append((row, req))
+    return plan
+
+def _error(e):
+    if isinstance(e, api.HttpException):
+        return "HTTP {}".format(e.status_code)
+    return str(e) or type(e).__name__
+
+class ResultWriter:
+    """Writes result rows, flushing each one so the file is complete up to the last finished row
+    even if the process dies."""
+
+    def __init__(self, f, format="csv"):
+        self.f = f
+        self.format = format
+        if format == "csv":
+            self.writer = csv.DictWriter(f, RESULT_COLUMNS, extrasaction="ignore")
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == "csv":
+            self.writer.writerow(row)
+        else:
+            line = codec.dumps({ c: row.get(c) for c in RESULT_COLUMNS })
+            self.f.write((line.decode() if isinstance(line, bytes) else line) + "\n")
+        self.f.flush()
+
+def save_rows(path, rows, format="csv"):
+    """Writes rows to path as a results file, replacing it only once they're all on disk."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = ResultWriter(f, format)
+        for row in rows:
+            writer.write(row)
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def submit_rows(client, rows, writer, concurrency=8, rate=None, progress=None):
+    """Submits rows with ``create_transfers`` and writes every row, with its outcome, to writer
+    in input order. progress, if given, is called with 1 as each row is written. Rows are
+    planned with ``plan_rows`` first, which keeps the keys they were already given.
+
+    Returns a dict counting the rows that were created, skipped (they already had a transferId)
+    and failed.
+    """
+    counts = { "created": 0, "skipped": 0, "failed": 0 }
+    plan = plan_rows(rows)
+
+    results = client.create_transfers((req for _, req in plan if req is not None), concurrency, rate)
+
+    for row, req in plan:
+        if req is None:
+            counts["skipped" if row.get("transferId") else "failed"] += 1
+        else:
+            result = next(results)
+            if result.ok:
+                row.update(transferId=result.transfer.id, status=result.transfer.status, error=None)
+                counts["created"] += 1
+            else:
+                row.update(transferId=None, status=None, error=_error(result.error))
+                counts["failed"] += 1
+        writer.write(row)
+        if progress is not None:
+            progress(1)
+
+    return counts
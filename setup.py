@@ -19,6 +19,12 @@ setup(
         'click==7.1.1',
         'requests==2.23.0',
     ],
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+        'fast': ['orjson'],
+        'parquet': ['pyarrow'],
+        'sns': ['cryptography'],
+    },
     entry_points={
         "console_scripts": [
             "cps = cps_client.cli:run"